@@ -0,0 +1,12 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def temporary_data(django_test_environment):
+    """Кэш, метаданные миниатюр и медиа тестов во временном каталоге."""
+    from core.testing import TemporaryData
+
+    data = TemporaryData()
+    data.enable()
+    yield
+    data.disable()
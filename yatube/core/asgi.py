@@ -0,0 +1,210 @@
+"""Запуск WSGI-приложения Django под ASGI-сервером.
+
+Django 2.2 не умеет ни ASGI, ни асинхронных view, поэтому обработка
+запроса остаётся синхронной и идёт в ограниченном пуле потоков, а
+в цикле событий выполняется только ввод-вывод с клиентом: чтение тела
+запроса и отправка ответа. Пока медленный клиент присылает тело
+запроса, поток с подключением к базе не занят. Ответ же от начала
+до ``close()`` выдаёт один поток пула, а в цикл событий куски уходят
+через ограниченный буфер.
+"""
+import asyncio
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Тело запроса больше этого размера держится во временном файле.
+BODY_MEMORY_LIMIT = 2 ** 20
+# Сколько сообщений ответа поток пула может выдать впрок.
+RESPONSE_BUFFER = 8
+
+
+class WSGIAdapter:
+    """ASGI-приложение (версия 3) поверх WSGI-приложения."""
+
+    def __init__(self, wsgi_application, max_workers):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix='asgi'
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f'Неподдерживаемое соединение {scope["type"]}')
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        body = tempfile.SpooledTemporaryFile(max_size=BODY_MEMORY_LIMIT)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    async def http(self, scope, receive, send):
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        stream = ResponseStream(asyncio.get_running_loop())
+        worker = stream.loop.run_in_executor(
+            self.executor, self.respond, scope, body, stream
+        )
+        try:
+            while True:
+                message = await stream.get()
+                if message is None:
+                    break
+                await send(message)
+        except BaseException:
+            # Клиент ушёл: поток пула бросает ответ и закрывает его.
+            stream.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+            raise
+        else:
+            await worker
+        finally:
+            body.close()
+
+    def respond(self, scope, body, stream):
+        """Обрабатывает запрос целиком в одном потоке пула.
+
+        Вызов view, выдача кусков потокового ответа и ``close()`` идут в
+        одном потоке: ``close()`` шлёт ``request_finished``, и
+        закрываются подключения к базе этого потока, а не чужого ответа,
+        который ещё читает базу.
+        """
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (name.lower().encode('latin1'), value.encode('latin1'))
+                for name, value in headers
+            ]
+
+        def send_start():
+            # Приложение-генератор вызывает start_response при выдаче
+            # первого куска, а не при вызове.
+            if 'sent' not in started:
+                started['sent'] = True
+                stream.put({
+                    'type': 'http.response.start',
+                    'status': started['status'],
+                    'headers': started['headers'],
+                })
+
+        try:
+            iterable = self.wsgi_application(
+                build_environ(scope, body), start_response
+            )
+            try:
+                for chunk in iterable:
+                    if chunk:
+                        send_start()
+                        stream.put({
+                            'type': 'http.response.body',
+                            'body': chunk,
+                            'more_body': True,
+                        })
+                send_start()
+                stream.put({'type': 'http.response.body', 'body': b''})
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+        finally:
+            stream.finish()
+
+
+class ResponseCancelled(Exception):
+    pass
+
+
+class ResponseStream:
+    """Сообщения ответа из потока пула в цикл событий.
+
+    Поток ждёт, пока в очереди больше ``RESPONSE_BUFFER`` сообщений:
+    медленный клиент притормаживает выдачу ответа, а не копит его
+    в памяти.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.slots = threading.Semaphore(RESPONSE_BUFFER)
+        self.cancelled = False
+
+    def put(self, message):
+        self.slots.acquire()
+        if self.cancelled:
+            raise ResponseCancelled
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, message)
+
+    def finish(self):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
+    async def get(self):
+        message = await self.queue.get()
+        self.slots.release()
+        return message
+
+    def cancel(self):
+        self.cancelled = True
+        self.slots.release()
+
+
+def wsgi_string(value):
+    # WSGI передаёт байты строк в кодировке latin-1.
+    return value.encode().decode('latin1')
+
+
+def build_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': wsgi_string(scope.get('root_path', '')),
+        'PATH_INFO': wsgi_string(scope['path']),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1] or 80),
+        'REMOTE_ADDR': client[0],
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            key = name
+        else:
+            key = f'HTTP_{name}'
+        if key in environ:
+            separator = '; ' if key == 'HTTP_COOKIE' else ','
+            environ[key] += separator + value
+        else:
+            environ[key] = value
+    return environ
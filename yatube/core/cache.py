@@ -0,0 +1,299 @@
+"""Кэш в файле SQLite, общий для всех процессов на машине.
+
+``LocMemCache`` у каждого воркера свой: фрагменты лент прогреваются
+в каждом процессе заново, а смена поколения в одном процессе не видна
+остальным. Этот бэкенд держит записи в одном файле в режиме WAL, так что
+чтения не блокируют друг друга, а запись идёт под блокировкой файла.
+
+Размер ограничен числом записей (``MAX_ENTRIES``) и суммарным объёмом
+значений в байтах (``MAX_SIZE``); при превышении сначала удаляются
+просроченные записи, затем давно не читанные (LRU). Попадания и промахи
+считаются в ``core.metrics``.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': '/path/to/cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 100_000, 'MAX_SIZE': 256 * 2 ** 20},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+# Время последнего чтения обновляем не чаще, чем раз в столько секунд,
+# иначе каждое чтение превращается в запись.
+ACCESS_RESOLUTION = 10
+# Сколько ключей подставлять в один запрос ``IN (...)``.
+LOOKUP_BATCH_SIZE = 500
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL,'
+    ' accessed REAL NOT NULL, size INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    # Число и объём записей ведут триггеры, чтобы не считать их COUNT(*)
+    # при каждой записи.
+    'CREATE TABLE IF NOT EXISTS cache_stats ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 1),'
+    ' entries INTEGER NOT NULL, size INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO cache_stats VALUES (1, 0, 0)',
+    'CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN'
+    ' UPDATE cache_stats SET entries = entries + 1, size = size + new.size;'
+    ' END',
+    'CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN'
+    ' UPDATE cache_stats SET entries = entries - 1, size = size - old.size;'
+    ' END',
+    'CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache'
+    ' BEGIN'
+    ' UPDATE cache_stats SET size = size - old.size + new.size;'
+    ' END',
+)
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 64 * 2 ** 20))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        # Соединение SQLite не переживает fork и не делится между
+        # потоками, поэтому держим своё на каждый поток каждого процесса.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self._path, timeout=self._busy_timeout, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with self._write(connection):
+                for statement in SCHEMA:
+                    connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def _write(self, connection=None):
+        """Транзакция, которая сразу берёт блокировку на запись, чтобы
+        чтение и запись внутри неё были атомарны относительно других
+        процессов.
+        """
+        connection = connection or self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _count(self, hit):
+        metrics.incr('cache_hits_total' if hit else 'cache_misses_total')
+
+    def _live(self, expires, now):
+        return expires is None or expires > now
+
+    def _touch_accessed(self, keys, now):
+        with self._write() as connection:
+            connection.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?',
+                [(now, key) for key in keys],
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        row = self._connection.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?', [key]
+        ).fetchone()
+        if row is None or not self._live(row[1], now):
+            self._count(False)
+            return default
+        self._count(True)
+        if row[2] < now - ACCESS_RESOLUTION:
+            self._touch_accessed([key], now)
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_key(key, version=version): key for key in keys}
+        for key in keys:
+            self.validate_key(key)
+        now = time.time()
+        found = {}
+        stale = []
+        made_keys = list(keys)
+        for start in range(0, len(made_keys), LOOKUP_BATCH_SIZE):
+            batch = made_keys[start:start + LOOKUP_BATCH_SIZE]
+            rows = self._connection.execute(
+                'SELECT key, value, expires, accessed FROM cache '
+                'WHERE key IN ({})'.format(', '.join('?' * len(batch))),
+                batch,
+            )
+            for key, value, expires, accessed in rows:
+                if self._live(expires, now):
+                    found[keys[key]] = pickle.loads(value)
+                    if accessed < now - ACCESS_RESOLUTION:
+                        stale.append(key)
+        metrics.incr('cache_hits_total', len(found))
+        metrics.incr('cache_misses_total', len(keys) - len(found))
+        if stale:
+            self._touch_accessed(stale, now)
+        return found
+
+    def _store(self, connection, key, value, timeout, only_new=False):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        if only_new:
+            row = connection.execute(
+                'SELECT expires FROM cache WHERE key = ?', [key]
+            ).fetchone()
+            if row is not None and self._live(row[0], now):
+                return False
+        data = pickle.dumps(value, self.pickle_protocol)
+        # Не INSERT OR REPLACE: замена удаляет строку, не вызывая
+        # триггер удаления, и счётчики в cache_stats разошлись бы.
+        connection.execute(
+            'INSERT INTO cache (key, value, expires, accessed, size) '
+            'VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires, '
+            'accessed = excluded.accessed, size = excluded.size',
+            [key, data, expires, now, len(data)],
+        )
+        self._cull(connection, now)
+        return True
+
+    def _cull(self, connection, now):
+        entries, size = connection.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        if entries <= self._max_entries and size <= self._max_size:
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            [now],
+        )
+        entries, size = connection.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        if entries <= self._max_entries and size <= self._max_size:
+            return
+        if self._cull_frequency == 0:
+            connection.execute('DELETE FROM cache')
+            return
+        # Как и другие бэкенды Django, при переполнении удаляем
+        # 1/CULL_FREQUENCY записей, только не случайных, а давно
+        # не читанных.
+        connection.execute(
+            'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+            'ORDER BY accessed LIMIT ?)',
+            [max(entries // self._cull_frequency, 1)],
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as connection:
+            self._store(connection, key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._write() as connection:
+            for key, value in data.items():
+                key = self.make_key(key, version=version)
+                self.validate_key(key)
+                self._store(connection, key, value, timeout)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as connection:
+            return self._store(connection, key, value, timeout, only_new=True)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as connection:
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', [key]
+            ).fetchone()
+            if row is None or not self._live(row[1], time.time()):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            data = pickle.dumps(value, self.pickle_protocol)
+            connection.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                [data, len(data), key],
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as connection:
+            updated = connection.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                [self.get_backend_timeout(timeout), key, time.time()],
+            ).rowcount
+        return bool(updated)
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._connection.execute(
+            'SELECT expires FROM cache WHERE key = ?', [key]
+        ).fetchone()
+        return row is not None and self._live(row[0], time.time())
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as connection:
+            connection.execute('DELETE FROM cache WHERE key = ?', [key])
+
+    def delete_many(self, keys, version=None):
+        made_keys = [self.make_key(key, version=version) for key in keys]
+        for key in made_keys:
+            self.validate_key(key)
+        with self._write() as connection:
+            connection.executemany(
+                'DELETE FROM cache WHERE key = ?', [[key] for key in made_keys]
+            )
+
+    def clear(self):
+        with self._write() as connection:
+            connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение держим открытым между запросами: открывать файл
+        # заново на каждый запрос дороже, чем сам запрос к кэшу.
+        pass
+
+
+def clear_caches():
+    """Очищает все кэши (команда ``clear_caches``).
+
+    Кэш переживает перезапуски, поэтому после миграций, меняющих данные
+    постов, в нём остались бы страницы и поколения от прежних данных.
+    """
+    for cache in caches.all():
+        cache.clear()
@@ -0,0 +1,196 @@
+"""Отдача статики и медиа самим Django для деплоя на одной машине.
+
+Файл целиком отдаётся через ``FileResponse``: WSGI-сервер с
+``wsgi.file_wrapper`` (gunicorn, uWSGI) передаёт его в сокет через
+``sendfile`` без копирования в процесс. Поддерживаются ``Range`` с одним
+диапазоном, проверка ETag и ``If-Modified-Since`` и заранее сжатые копии
+из ``core.storage``. Статика с хешем в имени кэшируется навсегда.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseNotModified)
+from django.utils._os import safe_join
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+from .storage import COMPRESSIBLE_EXTENSIONS
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Предпочтительные сжатые копии: расширение файла и Content-Encoding.
+ENCODINGS = (('.br', 'br'), ('.gz', 'gzip'))
+
+
+class FileRange:
+    """Часть открытого файла: читается не больше ``length`` байт."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def accepted_encodings(header):
+    encodings = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.add(coding.strip().lower())
+    return encodings
+
+
+def parse_range(header, size):
+    """Первый и последний байт диапазона из ``Range``.
+
+    ``None`` — заголовок не разобран или диапазонов несколько: тогда
+    отдаётся весь файл. ``ValueError`` — диапазон за концом файла.
+    """
+    match = RANGE_RE.match(header)
+    if match is None or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # bytes=-N: последние N байт.
+        length = int(end)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def choose_file(request, path):
+    """Сжатая копия, которую примет клиент, или сам файл.
+
+    Возвращает путь, ``Content-Encoding`` и результат ``os.stat``.
+    """
+    if (path.endswith(COMPRESSIBLE_EXTENSIONS)
+            and 'HTTP_RANGE' not in request.META):
+        accepted = accepted_encodings(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        for extension, encoding in ENCODINGS:
+            if encoding in accepted:
+                try:
+                    return path + extension, encoding, os.stat(
+                        path + extension
+                    )
+                except OSError:
+                    continue
+    return path, None, os.stat(path)
+
+
+def not_modified(request, etag, stat):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags or f'W/{etag}' in tags
+    return not was_modified_since(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'),
+        stat.st_mtime, stat.st_size,
+    )
+
+
+def serve(request, path, document_root, cache_control):
+    try:
+        full_path = safe_join(document_root, path)
+    except SuspiciousFileOperation:
+        raise Http404('Нет такого файла')
+    if not os.path.isfile(full_path):
+        raise Http404('Нет такого файла')
+    file_path, encoding, stat = choose_file(request, full_path)
+    etag = quote_etag(
+        f'{int(stat.st_mtime):x}-{stat.st_size:x}{encoding or ""}'
+    )
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': cache_control,
+        'Accept-Ranges': 'bytes',
+    }
+    if full_path.endswith(COMPRESSIBLE_EXTENSIONS):
+        headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        headers['Content-Encoding'] = encoding
+
+    if not_modified(request, etag, stat):
+        response = HttpResponseNotModified()
+    else:
+        response = file_response(request, file_path, stat, etag)
+    content_type, _ = mimetypes.guess_type(full_path)
+    response['Content-Type'] = content_type or 'application/octet-stream'
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def file_response(request, path, stat, etag):
+    size = stat.st_size
+    byte_range = None
+    if request.META.get('HTTP_IF_RANGE', etag) == etag:
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE', ''), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1
+    if request.method == 'HEAD':
+        response = HttpResponse()
+    elif byte_range is None:
+        # Файл целиком — с настоящим файлом, чтобы сработал sendfile.
+        response = FileResponse(open(path, 'rb'))
+    else:
+        response = FileResponse(FileRange(open(path, 'rb'), start, length))
+    if byte_range is not None:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = length
+    return response
+
+
+@require_safe
+def serve_static(request, path):
+    # Файл с хешем в имени никогда не меняется, остальные проверяются
+    # по ETag при каждом запросе.
+    if path in staticfiles_storage.hashed_names:
+        cache_control = (
+            f'public, max-age={settings.STATIC_CACHE_MAX_AGE}, immutable'
+        )
+    else:
+        cache_control = 'public, no-cache'
+    return serve(request, path, settings.STATIC_ROOT, cache_control)
+
+
+@require_safe
+def serve_media(request, path):
+    return serve(
+        request, path, settings.MEDIA_ROOT,
+        f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}',
+    )
@@ -0,0 +1,46 @@
+"""Номера поколений для версионирования ключей кэша.
+
+Каждая область (лента, группа, пост) имеет счётчик поколения. Ключ
+закэшированного фрагмента включает номера поколений его областей,
+поэтому изменение данных делает старые записи недостижимыми сразу,
+а не по истечении срока жизни.
+"""
+import time
+
+from django.core.cache import cache
+
+GENERATION_KEY = 'generation:{}'
+
+
+def _initial():
+    # Начинаем не с единицы, а с текущего времени: если счётчик
+    # вытеснят из кэша, новые номера не совпадут со старыми ключами.
+    return int(time.time() * 1000)
+
+
+def get_generations(scopes):
+    """Словарь ``{область: номер поколения}`` одним запросом к кэшу."""
+    keys = {GENERATION_KEY.format(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    generations = {keys[key]: value for key, value in found.items()}
+    for key, scope in keys.items():
+        if scope not in generations:
+            cache.add(key, _initial(), None)
+            generations[scope] = cache.get(key, _initial())
+    return generations
+
+
+def generation_tag(scopes):
+    """Строка с номерами поколений областей для включения в ключ."""
+    generations = get_generations(scopes)
+    return '.'.join(str(generations[scope]) for scope in sorted(scopes))
+
+
+def bump_generation(*scopes):
+    """Переводит области на новое поколение."""
+    for scope in set(scopes):
+        key = GENERATION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial(), None)
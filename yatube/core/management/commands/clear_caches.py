@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.cache import clear_caches
+
+
+class Command(BaseCommand):
+    help = (
+        'Очищает кэши. Запускается после миграций, меняющих данные постов: '
+        'кэш переживает перезапуски сервера.'
+    )
+
+    def handle(self, *args, **options):
+        clear_caches()
+        self.stdout.write('Кэши очищены')
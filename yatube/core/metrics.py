@@ -0,0 +1,46 @@
+"""Простейший реестр метрик процесса: счётчики, показатели и сборщики.
+
+Значения живут в памяти процесса и отдаются страницей ``/metrics/``
+в текстовом формате Prometheus.
+"""
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_collectors = []
+
+
+def incr(name, value=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name, value):
+    with _lock:
+        _gauges[name] = value
+
+
+def register_collector(collector):
+    """Регистрирует функцию, которая при снятии метрик вернёт словарь
+    ``{имя: значение}`` с показателями, которые дорого держать в памяти.
+    """
+    with _lock:
+        if collector not in _collectors:
+            _collectors.append(collector)
+
+
+def snapshot():
+    with _lock:
+        values = dict(_gauges)
+        values.update(_counters)
+        collectors = list(_collectors)
+    for collector in collectors:
+        values.update(collector())
+    return values
+
+
+def render():
+    return ''.join(
+        f'{name} {value}\n' for name, value in sorted(snapshot().items())
+    )
@@ -0,0 +1,97 @@
+"""Заполнение кэша одним запросом на ключ (single flight).
+
+Когда запись кэша устаревает, все запросы, которым она нужна, разом
+видят промах и каждый считает значение заново. ``get_or_set`` пускает
+считать только один из них:
+
+* потоки одного процесса ждут результат первого потока и получают его
+  без обращения к кэшу;
+* процессы договариваются через блокировку ``cache.add`` в общем кэше:
+  остальные ждут, пока значение появится в кэше.
+
+Если считающий запрос упал или не уложился в ``SINGLE_FLIGHT_WAIT``
+секунд, ожидающие считают значение сами — медленная страница лучше
+ошибки.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from . import metrics
+
+LOCK_KEY = 'single-flight:{}'
+
+_lock = threading.Lock()
+_flights = {}
+
+
+class Flight:
+    """Заполнение ключа, которое уже идёт в этом процессе."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.failed = False
+
+
+def get_or_set(key, fill, timeout=DEFAULT_TIMEOUT, cache=None):
+    """Значение ``key`` из кэша; при промахе его один раз считает
+    ``fill()`` и кладёт в кэш на ``timeout`` секунд.
+
+    ``None`` не кэшируется, как и в ``{% cache %}``.
+    """
+    cache = cache or default_cache
+    value = cache.get(key)
+    if value is not None:
+        return value
+    with _lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = Flight()
+    if not leader:
+        metrics.incr('single_flight_waits_total')
+        if flight.done.wait(settings.SINGLE_FLIGHT_WAIT) and not flight.failed:
+            return flight.value
+        return fill()
+    try:
+        flight.value = _fill_shared(key, fill, timeout, cache)
+    except BaseException:
+        flight.failed = True
+        raise
+    finally:
+        with _lock:
+            del _flights[key]
+        flight.done.set()
+    return flight.value
+
+
+def _fill_shared(key, fill, timeout, cache):
+    lock_key = LOCK_KEY.format(key)
+    if cache.add(lock_key, 1, settings.SINGLE_FLIGHT_LOCK_TIMEOUT):
+        try:
+            return _fill(key, fill, timeout, cache)
+        finally:
+            cache.delete(lock_key)
+    metrics.incr('single_flight_waits_total')
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if not cache.has_key(lock_key):
+            # Считавший процесс закончил, не положив значение, — упал.
+            break
+    return _fill(key, fill, timeout, cache)
+
+
+def _fill(key, fill, timeout, cache):
+    metrics.incr('single_flight_fills_total')
+    value = fill()
+    if value is not None:
+        cache.set(key, value, timeout)
+    return value
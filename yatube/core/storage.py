@@ -0,0 +1,71 @@
+"""Хранилище статики с хешами в именах и сжатыми копиями файлов.
+
+``collectstatic`` сохраняет рядом с текстовыми файлами копии ``.gz`` и,
+если установлен пакет ``brotli``, ``.br``: ``core.files`` отдаёт их
+клиентам, которые принимают такое сжатие, без сжатия на каждый запрос.
+"""
+import gzip
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.utils.functional import cached_property
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.map', '.json', '.svg', '.txt', '.html', '.xml',
+    '.ico', '.ttf', '.eot', '.otf',
+)
+
+
+def compressors():
+    yield '.gz', lambda content: gzip.compress(content, 9, mtime=0)
+    if brotli is not None:
+        yield '.br', lambda content: brotli.compress(content, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    @cached_property
+    def hashed_names(self):
+        """Имена файлов с хешем из манифеста."""
+        return frozenset(self.hashed_files.values())
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Без манифеста (collectstatic ещё не запускался, например в
+            # разработке и тестах) ссылки ведут на файлы без хеша.
+            if self.hashed_files:
+                raise
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            for compressed_name in self.compress(name):
+                yield name, compressed_name, True
+
+    def compress(self, name):
+        """Сохраняет сжатые копии файла, если они заметно меньше."""
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            return
+        with self.open(name) as file:
+            content = file.read()
+        if len(content) < settings.STATIC_COMPRESS_MIN_SIZE:
+            return
+        for extension, compress in compressors():
+            compressed = compress(content)
+            if len(compressed) > len(content) * 0.9:
+                continue
+            compressed_name = name + extension
+            self.delete(compressed_name)
+            self._save(compressed_name, ContentFile(compressed))
+            yield compressed_name
@@ -0,0 +1,54 @@
+"""Тесты с кэшем, метаданными миниатюр и медиа во временном каталоге.
+
+Настройки по умолчанию указывают на файлы работающего сервера: тесты,
+которые чистят кэш или пишут картинки, не должны их трогать.
+``manage.py test`` подключает это через ``TEST_RUNNER``, pytest — через
+фикстуру в ``conftest.py``.
+"""
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+def temporary_data_settings(directory):
+    """Настройки, которые уводят файлы данных в ``directory``."""
+    caches = copy.deepcopy(settings.CACHES)
+    caches['default']['LOCATION'] = os.path.join(directory, 'cache.sqlite3')
+    return {
+        'CACHES': caches,
+        'THUMBNAIL_KVSTORE_PATH': os.path.join(
+            directory, 'thumbnails.sqlite3'
+        ),
+        'MEDIA_ROOT': os.path.join(directory, 'media'),
+    }
+
+
+class TemporaryData:
+    """Временный каталог данных на время тестов."""
+
+    def enable(self):
+        self.directory = tempfile.mkdtemp(prefix='yatube-tests-')
+        self.override = override_settings(
+            **temporary_data_settings(self.directory)
+        )
+        self.override.enable()
+
+    def disable(self):
+        self.override.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class TemporaryDataRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.temporary_data = TemporaryData()
+        self.temporary_data.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.temporary_data.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,99 @@
+"""JSON API только для чтения поверх тех же лент, что и HTML-страницы.
+
+Ответ собирается из словарей с нужными клиенту полями и сериализуется
+одним ``json.dumps`` без шаблонов. Страницы листаются тем же курсором,
+что и HTML (``?cursor=``), проверка ETag та же, а ответ сжимается gzip,
+если клиент его принимает. ``gzip_page`` стоит снаружи ``condition``:
+у сжатого ответа ETag становится слабым и не совпадает с ETag
+несжатого.
+"""
+import json
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_GET
+
+from .cards import is_truncated, preview
+from .etags import (follow_etag, group_etag, index_etag, profile_etag,
+                    remember_id)
+from .models import Group, Post, User
+from .paginator import CursorPaginator
+from .timeline import TimelinePaginator
+
+
+def serialize_post(post):
+    return {
+        'id': post.pk,
+        'text': preview(post),
+        # Полный текст — на странице поста.
+        'truncated': is_truncated(post),
+        'pub_date': post.pub_date.isoformat(),
+        'author': {
+            'username': post.author.username,
+            'name': post.author.get_full_name(),
+        },
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+    }
+
+
+def json_response(data, status=200):
+    return HttpResponse(
+        json.dumps(data, ensure_ascii=False, separators=(',', ':')),
+        content_type='application/json',
+        status=status,
+    )
+
+
+def feed_response(request, queryset, paginator_class=CursorPaginator,
+                  **paginator_kwargs):
+    paginator = paginator_class(
+        queryset, settings.POSTS_ORDERED_BY, **paginator_kwargs
+    )
+    page = paginator.get_cursor_page(request.GET.get('cursor'))
+    return json_response({
+        'results': [serialize_post(post) for post in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+
+@gzip_page
+@require_GET
+@condition(etag_func=index_etag)
+def index(request):
+    return feed_response(request, Post.objects.for_index())
+
+
+@gzip_page
+@require_GET
+@condition(etag_func=group_etag)
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    remember_id('group', slug, group.pk)
+    return feed_response(request, Post.objects.for_group(group))
+
+
+@gzip_page
+@require_GET
+@condition(etag_func=profile_etag)
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    remember_id('user', username, author.pk)
+    return feed_response(request, Post.objects.for_author(author))
+
+
+@gzip_page
+@require_GET
+@condition(etag_func=follow_etag)
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return json_response({'error': 'Нужно войти'}, status=401)
+    return feed_response(
+        request,
+        Post.objects.for_follower(request.user),
+        paginator_class=TimelinePaginator,
+        user=request.user,
+    )
@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        # Подключаем обработчики сигналов моделей.
+        from core import metrics
+        from . import signals  # noqa: F401
+        from .timeline import collect_metrics
+        metrics.register_collector(collect_metrics)
@@ -0,0 +1,428 @@
+"""Пакетная загрузка постов, комментариев и подписок.
+
+Загрузка принимает поток записей — словарей с полем ``type``::
+
+    {"type": "follow", "user": "reader", "author": "leo"}
+    {"type": "post", "ref": "p1", "author": "leo", "text": "...",
+     "group": "cats", "pub_date": "2021-01-01T10:00:00Z", "image": "a.jpg"}
+    {"type": "comment", "post_ref": "p1", "author": "reader",
+     "text": "...", "created": "2021-01-02T10:00:00Z"}
+
+Комментарий ссылается на загруженный пост по ``post_ref`` или на
+существующий — по id в поле ``post``. Поля ``group``, ``pub_date``,
+``created`` и ``image`` необязательны.
+
+Записи пишутся пачками по ``BULK_IMPORT_CHUNK_SIZE`` через
+``bulk_create``, каждая пачка — в своей транзакции. ``bulk_create`` не
+посылает сигналов, поэтому счётчики, ленты подписок, поисковый индекс
+и поколения кэша обновляются сразу для всей пачки, а картинки
+сохраняются в хранилище параллельно. Если пачка откатилась, её файлы
+без ссылок удаляются.
+"""
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.files.base import ContentFile
+from django.db import connections, router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core import metrics
+
+from . import counters, feed_cache, search, timeline
+from .images import prepare_upload
+from .images import release as release_image
+from .models import Comment, Follow, Group, Post, StoredImage, User
+from .thumbnails import schedule as schedule_thumbnails
+
+RECORD_TYPES = ('follow', 'post', 'comment')
+# Поля записей, значения которых — только строки.
+STRING_FIELDS = (
+    'user', 'author', 'group', 'text', 'ref', 'post_ref', 'image',
+    'pub_date', 'created',
+)
+
+
+class BulkImportError(ValueError):
+    """Ошибка в записи; ``number`` — номер записи в потоке с единицы."""
+
+    def __init__(self, number, message):
+        super().__init__(f'Запись {number}: {message}')
+        self.number = number
+
+
+class ImportStats:
+    def __init__(self):
+        self.posts = 0
+        self.comments = 0
+        self.follows = 0
+        self.images = 0
+        self.seconds = 0.0
+
+    @property
+    def records(self):
+        return self.posts + self.comments + self.follows
+
+    @property
+    def records_per_second(self):
+        return self.records / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            'posts': self.posts,
+            'comments': self.comments,
+            'follows': self.follows,
+            'images': self.images,
+            'seconds': round(self.seconds, 3),
+            'records_per_second': round(self.records_per_second, 1),
+        }
+
+    def __str__(self):
+        return (
+            f'постов: {self.posts}, комментариев: {self.comments}, '
+            f'подписок: {self.follows}, картинок: {self.images} '
+            f'за {self.seconds:.1f} с '
+            f'({self.records_per_second:.0f} записей в секунду)'
+        )
+
+
+def upload_opener(files):
+    """``open_image`` для файлов формы.
+
+    Одно поле формы могут назвать несколько записей и пачек, поэтому
+    каждый вызов получает свою копию, а сама загрузка не закрывается.
+    """
+    def open_image(name):
+        upload = files[name]
+        upload.seek(0)
+        return ContentFile(upload.read(), name=upload.name)
+    return open_image
+
+
+def assign_ids(model, objs):
+    """Проставляет id объектам, сохранённым ``bulk_create``.
+
+    PostgreSQL возвращает id вставленных строк сам. SQLite — нет, но
+    пишет транзакции по одной, так что строки этой вставки — последние
+    в таблице и идут по порядку. На других базах так угадывать id
+    нельзя, и загрузка на них не работает.
+    """
+    if not objs:
+        return
+    connection = connections[router.db_for_write(model)]
+    # В Django 3.0 признак переименован в can_return_rows_from_bulk_insert.
+    if (getattr(connection.features, 'can_return_rows_from_bulk_insert',
+                False)
+            or connection.features.can_return_ids_from_bulk_insert):
+        return
+    if connection.vendor != 'sqlite':
+        raise ImproperlyConfigured(
+            f'Пакетная загрузка не поддерживает базу {connection.vendor}'
+        )
+    ids = model.objects.order_by('-pk').values_list('pk', flat=True)
+    for obj, pk in zip(objs, reversed(ids[:len(objs)])):
+        obj.pk = pk
+
+
+def parse_date(number, value):
+    if value is None:
+        return None
+    date = parse_datetime(value) if isinstance(value, str) else None
+    if date is None:
+        raise BulkImportError(number, f'неверная дата {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date, timezone.utc)
+    return date
+
+
+def check_types(number, record):
+    for field in STRING_FIELDS:
+        value = record.get(field)
+        if value is not None and not isinstance(value, str):
+            raise BulkImportError(
+                number, f'поле {field!r} должно быть строкой'
+            )
+
+
+def required(number, record, field):
+    value = record.get(field)
+    if value in (None, ''):
+        raise BulkImportError(number, f'нет поля {field!r}')
+    return value
+
+
+class BulkImporter:
+    """Загружает записи пачками и копит статистику в ``stats``.
+
+    ``open_image(name)`` возвращает файл картинки поста по значению
+    поля ``image``; без неё записи с картинками не принимаются.
+    """
+
+    def __init__(self, open_image=None, chunk_size=None, progress=None):
+        self.open_image = open_image
+        self.chunk_size = chunk_size or settings.BULK_IMPORT_CHUNK_SIZE
+        self.progress = progress
+        self.post_refs = {}
+        self.stats = ImportStats()
+
+    def run(self, records):
+        chunk = []
+        for number, record in enumerate(records, 1):
+            chunk.append((number, record))
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.import_chunk(chunk)
+        return self.stats
+
+    def import_chunk(self, chunk):
+        started = time.monotonic()
+        grouped = {kind: [] for kind in RECORD_TYPES}
+        for number, record in chunk:
+            kind = record.get('type') if isinstance(record, dict) else None
+            if kind not in grouped:
+                raise BulkImportError(number, 'неизвестный тип записи')
+            check_types(number, record)
+            grouped[kind].append((number, record))
+        users = self.load_users(chunk)
+        follows = self.build_follows(grouped['follow'], users)
+        posts, post_dates, images = self.build_posts(grouped['post'], users)
+        refs = [record.get('ref') for _, record in grouped['post']]
+        comments, comment_dates = self.build_comments(
+            grouped['comment'], users, set(refs)
+        )
+        try:
+            with transaction.atomic():
+                self.store_images(posts, images)
+                Follow.objects.bulk_create(follows, ignore_conflicts=True)
+                self.insert(Post, posts, post_dates, 'pub_date')
+                self.link_comments(posts, refs, comments)
+                self.insert(Comment, comments, comment_dates, 'created')
+                self.update_derived(posts, comments, follows)
+        except Exception:
+            # Посты пачки откатились: сохранённые для них файлы, на
+            # которые никто больше не ссылается, удаляются.
+            for post in posts:
+                release_image(post.image.name)
+            raise
+        self.stats.posts += len(posts)
+        self.stats.comments += len(comments)
+        self.stats.follows += len(follows)
+        self.stats.images += len(images)
+        self.stats.seconds += time.monotonic() - started
+        metrics.incr('bulk_import_records_total', len(chunk))
+        if self.progress is not None:
+            self.progress(self.stats)
+
+    def link_comments(self, posts, refs, comments):
+        """Проставляет комментариям id постов, загруженных по ``ref``."""
+        for post, ref in zip(posts, refs):
+            if ref is not None:
+                self.post_refs[ref] = post.pk
+        for comment in comments:
+            if comment.post_id is None:
+                comment.post_id = self.post_refs[comment.post_ref]
+
+    def load_users(self, chunk):
+        names = {
+            record.get(field)
+            for _, record in chunk
+            for field in ('user', 'author')
+            if isinstance(record, dict)
+        }
+        names.discard(None)
+        return dict(
+            User.objects.filter(username__in=names)
+            .values_list('username', 'pk')
+        )
+
+    def user_id(self, number, record, field, users):
+        name = required(number, record, field)
+        if name not in users:
+            raise BulkImportError(number, f'нет пользователя {name!r}')
+        return users[name]
+
+    def build_follows(self, records, users):
+        follows = []
+        for number, record in records:
+            user_id = self.user_id(number, record, 'user', users)
+            author_id = self.user_id(number, record, 'author', users)
+            if user_id == author_id:
+                raise BulkImportError(number, 'подписка на самого себя')
+            follows.append(Follow(user_id=user_id, author_id=author_id))
+        return follows
+
+    def build_posts(self, records, users):
+        slugs = {record.get('group') for _, record in records}
+        slugs.discard(None)
+        groups = dict(
+            Group.objects.filter(slug__in=slugs).values_list('slug', 'pk')
+        )
+        posts = []
+        dates = []
+        images = {}
+        for number, record in records:
+            slug = record.get('group')
+            if slug is not None and slug not in groups:
+                raise BulkImportError(number, f'нет группы {slug!r}')
+            post = Post(
+                text=required(number, record, 'text'),
+                author_id=self.user_id(number, record, 'author', users),
+                group_id=groups.get(slug),
+            )
+            if record.get('image'):
+                if self.open_image is None:
+                    raise BulkImportError(number, 'картинки не принимаются')
+                images[len(posts)] = (number, record['image'])
+            posts.append(post)
+            dates.append(parse_date(number, record.get('pub_date')))
+        return posts, dates, images
+
+    def build_comments(self, records, users, chunk_refs):
+        post_ids = set()
+        for number, record in records:
+            post_id = record.get('post')
+            if post_id is None:
+                continue
+            if not isinstance(post_id, int) or isinstance(post_id, bool):
+                raise BulkImportError(number, f'неверный id поста {post_id!r}')
+            post_ids.add(post_id)
+        existing = set(
+            Post.objects.filter(pk__in=post_ids).values_list('pk', flat=True)
+        )
+        comments = []
+        dates = []
+        for number, record in records:
+            comment = Comment(
+                text=required(number, record, 'text'),
+                author_id=self.user_id(number, record, 'author', users),
+                post_id=record.get('post'),
+            )
+            comment.post_ref = record.get('post_ref')
+            if comment.post_id is not None:
+                if comment.post_id not in existing:
+                    raise BulkImportError(
+                        number, f'нет поста {comment.post_id!r}'
+                    )
+            elif (comment.post_ref not in chunk_refs
+                    and comment.post_ref not in self.post_refs):
+                raise BulkImportError(number, 'неизвестный пост')
+            comments.append(comment)
+            dates.append(parse_date(number, record.get('created')))
+        return comments, dates
+
+    def store_images(self, posts, images):
+        """Проверяет, пережимает и сохраняет картинки в несколько потоков.
+
+        Картинки проверяются и пережимаются так же, как загруженные
+        через форму поста (см. ``images.prepare_upload``). Каждый файл
+        читается один раз, даже если его называют несколько записей
+        пачки. Вызывается в транзакции пачки: строки сохранённых файлов
+        блокируются до её конца, как в ``Post.save``.
+        """
+        if not images:
+            return
+        field = Post._meta.get_field('image')
+        by_name = defaultdict(list)
+        for index, (number, name) in images.items():
+            by_name[name].append(index)
+
+        def store(item):
+            name, indexes = item
+            stored, processed = self.store_image(
+                images[indexes[0]][0], name
+            )
+            for index in indexes:
+                posts[index].image = stored
+            return stored, processed
+
+        with ThreadPoolExecutor(settings.BULK_IMPORT_IMAGE_WORKERS) as pool:
+            # list() — чтобы исключение из потока дошло до вызывающего.
+            stored = list(pool.map(store, by_name.items()))
+        numbers = {posts[index].image.name: number
+                   for index, (number, _) in images.items()}
+        # Потоки пишут файлы без транзакции, поэтому блокировки берутся
+        # после записи, в одном порядке во всех процессах. Файл, который
+        # успели удалить между записью и блокировкой, не сохранён.
+        for name in sorted(numbers):
+            StoredImage.objects.lock(name)
+            if not field.storage.exists(name):
+                raise BulkImportError(
+                    numbers[name], 'картинка удалена во время загрузки'
+                )
+        StoredImage.objects.filter(
+            name__in=[name for name, processed in stored if processed]
+        ).update(processed=True)
+
+    def store_image(self, number, name):
+        """Сохраняет картинку записи ``number``; возвращает имя файла
+        и признак того, что картинка уже обработана.
+        """
+        try:
+            with self.open_image(name) as image:
+                filename = os.path.basename(image.name or name)
+                content = ContentFile(image.read(), filename)
+        except (KeyError, OSError, ValueError):
+            raise BulkImportError(number, f'нет картинки {name!r}')
+        try:
+            content, processed = prepare_upload(content)
+        except ValidationError as error:
+            raise BulkImportError(
+                number, f'картинка {name!r}: {" ".join(error.messages)}'
+            )
+        field = Post._meta.get_field('image')
+        stored = field.storage.save(
+            field.generate_filename(None, content.name), content
+        )
+        return stored, processed
+
+    def insert(self, model, objs, dates, date_field):
+        """``bulk_create`` с датами из записей.
+
+        Поле даты заполняется при вставке (``auto_now_add``), поэтому
+        переданные даты проставляются отдельным ``bulk_update``.
+        """
+        model.objects.bulk_create(objs)
+        assign_ids(model, objs)
+        dated = []
+        for obj, date in zip(objs, dates):
+            if date is not None:
+                setattr(obj, date_field, date)
+                dated.append(obj)
+        model.objects.bulk_update(dated, [date_field])
+
+    def update_derived(self, posts, comments, follows):
+        """То, что для одиночных записей делают сигналы."""
+        by_delta = defaultdict(list)
+        feed_counts = defaultdict(int)
+        for post in posts:
+            for key in counters.post_feed_keys(post):
+                feed_counts[key] += 1
+        for key, delta in feed_counts.items():
+            by_delta[delta].append(key)
+        for delta, keys in by_delta.items():
+            counters.adjust_feed_counts(keys, delta)
+
+        # Подписки с ignore_conflicts могли оказаться дублями, поэтому
+        # счётчики затронутых пользователей пересчитываются точно.
+        user_ids = {post.author_id for post in posts}
+        user_ids.update(comment.author_id for comment in comments)
+        for follow in follows:
+            user_ids.update([follow.user_id, follow.author_id])
+        counters.rebuild_user_counters(list(user_ids))
+
+        for author_id in {follow.author_id for follow in follows}:
+            timeline.promote_if_celebrity(author_id)
+        for follow in follows:
+            timeline.backfill(follow.user_id, follow.author_id)
+        timeline.fan_out_posts(posts)
+
+        search.index_posts(posts)
+        feed_cache.bulk_changed(posts, comments, follows)
+        for post in posts:
+            schedule_thumbnails(post.image)
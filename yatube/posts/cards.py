@@ -0,0 +1,98 @@
+"""Кэш отрисованных карточек постов.
+
+Карточка поста одинакова на всех страницах, где выводится в одном
+варианте, поэтому рисуется один раз и кэшируется по ключу из id
+поста, времени его изменения, поколений групп и автора и готовности
+миниатюры. Страница
+ленты достаёт все свои карточки одним ``get_many`` и дорисовывает только
+недостающие.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.text import Truncator
+
+from core.generations import get_generations
+
+from .feed_cache import GROUPS_SCOPE, author_scope
+from .thumbnails import prepared_thumbnails
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+CARD_THUMBNAIL = '960x339'
+CARD_VARIANTS = {
+    'index': {'show_author': True},
+    'follow': {'show_author': True},
+    'group': {
+        'show_author': True,
+        'show_profile_link': True,
+        'show_detail_link': True,
+    },
+    'profile': {'show_detail_link': True},
+    'search': {
+        'show_author': True,
+        'show_profile_link': True,
+        'show_detail_link': True,
+    },
+}
+
+
+def card_key(post, variant, generations, image=None):
+    # Карточку с исходной картинкой вместо миниатюры рисуем заново,
+    # когда миниатюра будет готова.
+    ready = int(image is None or image is not post.image)
+    return (
+        f'post_card:{variant}:{post.pk}:{post.updated.timestamp()}:'
+        f'{generations[GROUPS_SCOPE]}.'
+        f'{generations[author_scope(post.author_id)]}:{ready}'
+    )
+
+
+def preview(post):
+    """Начало текста поста: из ``text_preview`` ленточной выборки
+    или, если его нет, из полного текста.
+    """
+    return Truncator(source_text(post)).chars(settings.POST_PREVIEW_LENGTH)
+
+
+def source_text(post):
+    text = getattr(post, 'text_preview', None)
+    return post.text if text is None else text
+
+
+def is_truncated(post):
+    """Не влез ли текст поста в карточку целиком."""
+    return len(source_text(post)) > settings.POST_PREVIEW_LENGTH
+
+
+def render_cards(posts, variant):
+    """Список HTML карточек постов в порядке ``posts``."""
+    options = CARD_VARIANTS[variant]
+    generations = get_generations(
+        {GROUPS_SCOPE} | {author_scope(post.author_id) for post in posts}
+    )
+    images = prepared_thumbnails(
+        [post.image for post in posts], CARD_THUMBNAIL
+    )
+    keys = [
+        card_key(post, variant, generations, image)
+        for post, image in zip(posts, images)
+    ]
+    cards = cache.get_many(keys)
+    missing = {
+        key: render_to_string(
+            CARD_TEMPLATE,
+            {
+                'post': post,
+                'image': image,
+                'text': preview(post),
+                'truncated': is_truncated(post),
+                **options,
+            },
+        )
+        for key, post, image in zip(keys, posts, images)
+        if key not in cards
+    }
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(missing)
+    return [cards[key] for key in keys]
@@ -0,0 +1,43 @@
+"""Постраничный вывод комментариев к посту.
+
+Комментарии листаются курсором по ключу ``(created, id)`` по индексу
+``(post, created, id)``. Первая страница, которую видит каждый
+посетитель поста, кэшируется; ключ включает поколение поста, так что
+новый комментарий сбрасывает её сразу.
+"""
+from django.conf import settings
+
+from core.generations import generation_tag
+from core.singleflight import get_or_set
+
+from .feed_cache import post_scope
+from .models import Comment
+from .paginator import CursorPaginator
+
+FIRST_PAGE_KEY = 'comments:first:{}:{}'
+
+
+def comment_paginator(post):
+    return CursorPaginator(
+        Comment.objects.filter(post=post).select_related('author'),
+        settings.COMMENTS_PER_PAGE,
+        ordering=('created', 'pk'),
+    )
+
+
+def fetch_comment_page(post, cursor=None):
+    page = comment_paginator(post).get_cursor_page(cursor)
+    return list(page), page.next_cursor
+
+
+def get_comment_page(post, cursor=None):
+    """Комментарии страницы и курсор следующей (``None`` на последней)."""
+    if cursor:
+        return fetch_comment_page(post, cursor)
+    key = FIRST_PAGE_KEY.format(
+        post.pk, generation_tag([post_scope(post.pk)])
+    )
+    return get_or_set(
+        key, lambda: fetch_comment_page(post),
+        settings.COMMENTS_CACHE_TIMEOUT,
+    )
@@ -0,0 +1,179 @@
+"""Счётчики постов в лентах вместо ``COUNT(*)`` на каждой странице.
+
+Для каждой ленты (общей, группы, автора) хранится строка ``FeedCounter``,
+которую сигналы ``Post`` сдвигают на ±1. Строка создаётся при первом
+обращении: для лент группы и автора точным подсчётом по индексу, а для
+общей ленты на очень большой таблице — оценкой планировщика.
+
+Счётчики пользователя (посты, подписчики, подписки, комментарии) лежат
+в ``UserCounters`` и ведутся так же: сигналы сдвигают уже заведённую
+строку, а заводится она точным подсчётом при первом чтении.
+"""
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, F
+
+from .models import Comment, FeedCounter, Follow, Post, UserCounters
+
+GLOBAL_FEED = 'all'
+
+
+def feed_key(group=None, author=None):
+    if group is not None:
+        return f'group:{getattr(group, "pk", group)}'
+    if author is not None:
+        return f'author:{getattr(author, "pk", author)}'
+    return GLOBAL_FEED
+
+
+def post_feed_keys(post, group_id=None):
+    """Ключи всех лент, в которых показан пост."""
+    if group_id is None:
+        group_id = post.group_id
+    keys = [GLOBAL_FEED, feed_key(author=post.author_id)]
+    if group_id is not None:
+        keys.append(feed_key(group=group_id))
+    return keys
+
+
+def estimate_table_rows(model):
+    """Оценка числа строк таблицы по статистике планировщика.
+
+    Возвращает ``None``, если СУБД не даёт оценки или статистика
+    ещё не собрана (для SQLite — до первого ``ANALYZE``).
+    """
+    table = model._meta.db_table
+    queries = {
+        'postgresql': (
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass'
+        ),
+        'mysql': (
+            'SELECT table_rows FROM information_schema.tables '
+            'WHERE table_schema = DATABASE() AND table_name = %s'
+        ),
+        'sqlite': 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+    }
+    sql = queries.get(connection.vendor)
+    if sql is None:
+        return None
+    try:
+        # Савепойнт: в PostgreSQL ошибка запроса иначе ломает транзакцию.
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if not row or row[0] is None:
+        return None
+    # В sqlite_stat1 первое число в поле stat — количество строк.
+    value = int(str(row[0]).split()[0])
+    return value if value >= 0 else None
+
+
+def count_feed(key):
+    """Подсчёт постов ленты с нуля."""
+    if key == GLOBAL_FEED:
+        estimate = estimate_table_rows(Post)
+        if (estimate is not None
+                and estimate >= settings.FEED_COUNT_ESTIMATE_THRESHOLD):
+            return estimate
+        return Post.objects.count()
+    kind, pk = key.split(':', 1)
+    return Post.objects.filter(**{f'{kind}_id': pk}).count()
+
+
+def get_feed_count(group=None, author=None):
+    """Число постов в ленте (для очень большой общей ленты — примерное)."""
+    key = feed_key(group=group, author=author)
+    value = (
+        FeedCounter.objects.filter(key=key)
+        .values_list('value', flat=True).first()
+    )
+    if value is not None:
+        return max(value, 0)
+    # get_or_create переживает гонку с параллельным запросом.
+    counter, _ = FeedCounter.objects.get_or_create(
+        key=key, defaults={'value': count_feed(key)}
+    )
+    return max(counter.value, 0)
+
+
+def adjust_feed_counts(keys, delta):
+    """Сдвигает уже заведённые счётчики лент на ``delta``."""
+    FeedCounter.objects.filter(key__in=keys).update(value=F('value') + delta)
+
+
+def drop_feed_count(key):
+    FeedCounter.objects.filter(key=key).delete()
+
+
+# Поле счётчика пользователя: (модель, поле со ссылкой на пользователя).
+USER_COUNTER_SOURCES = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+    'comments_count': (Comment, 'author'),
+}
+
+
+def count_users(user_ids):
+    """Точные счётчики пользователей: ``{id: {поле: значение}}``."""
+    counts = {
+        user_id: dict.fromkeys(USER_COUNTER_SOURCES, 0)
+        for user_id in user_ids
+    }
+    for field, (model, user_field) in USER_COUNTER_SOURCES.items():
+        rows = (
+            model.objects.filter(**{f'{user_field}__in': user_ids})
+            .order_by().values_list(user_field)
+            .annotate(total=Count('pk'))
+        )
+        for user_id, total in rows:
+            counts[user_id][field] = total
+    return counts
+
+
+def get_user_counters(user):
+    """Счётчики пользователя; выбранные через
+    ``select_related('counters')`` не требуют запроса.
+    """
+    try:
+        return user.counters
+    except UserCounters.DoesNotExist:
+        pass
+    counters, _ = UserCounters.objects.get_or_create(
+        user=user, defaults=count_users([user.pk])[user.pk]
+    )
+    return counters
+
+
+def adjust_user_counters(user_id, **deltas):
+    """Сдвигает уже заведённые счётчики пользователя:
+    ``adjust_user_counters(user.pk, posts_count=1)``.
+    """
+    UserCounters.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def rebuild_user_counters(user_ids):
+    """Точно пересчитывает счётчики пользователей и заводит недостающие.
+
+    Возвращает число созданных и исправленных строк.
+    """
+    counts = count_users(user_ids)
+    existing = UserCounters.objects.select_for_update().in_bulk(user_ids)
+    created = []
+    updated = []
+    for user_id, values in counts.items():
+        counters = existing.get(user_id)
+        if counters is None:
+            created.append(UserCounters(user_id=user_id, **values))
+        elif any(getattr(counters, field) != value
+                 for field, value in values.items()):
+            for field, value in values.items():
+                setattr(counters, field, value)
+            updated.append(counters)
+    UserCounters.objects.bulk_create(created, ignore_conflicts=True)
+    UserCounters.objects.bulk_update(updated, list(USER_COUNTER_SOURCES))
+    return len(created) + len(updated)
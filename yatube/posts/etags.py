@@ -0,0 +1,111 @@
+"""ETag страниц лент и поста для условных GET-запросов.
+
+ETag собирается из номеров поколений областей, от которых зависит
+страница (см. ``feed_cache``), и пользователя с его CSRF-токеном: шапка
+и формы у каждого свои. Номера поколений берутся из кэша одним
+запросом, поэтому на неизменившуюся страницу ``condition`` отвечает
+304, не выполняя запрос ленты и не отрисовывая шаблон. Адрес
+страницы, в том числе курсор, в ETag не входит: браузер хранит ответы
+по адресу.
+
+Области группы и автора заданы их id, а в адресе — slug, имя
+пользователя или id поста; соответствие запоминают в кэше сами view,
+чтобы проверка ETag не добавляла запрос к базе.
+
+Last-Modified не выставляется: дата публикации не меняется при правке
+поста и добавлении комментария, а поколения не привязаны ко времени.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.generations import generation_tag
+
+from .feed_cache import (GROUPS_SCOPE, POSTS_SCOPE, author_scope,
+                         feed_scopes, follow_scope, followers_scope,
+                         group_scope, post_scope)
+
+ID_KEY = 'etag-id:{}:{}'
+
+
+def known_id(kind, value):
+    return cache.get(ID_KEY.format(kind, value))
+
+
+def remember_id(kind, value, object_id):
+    """Запоминает соответствие, когда view уже загрузила объект.
+
+    Пока соответствия нет, ETag не выставляется: искать id отдельным
+    запросом ради проверки дороже, чем один раз отдать страницу целиком.
+    """
+    cache.add(ID_KEY.format(kind, value), object_id,
+              settings.FEED_CACHE_TIMEOUT)
+
+
+def forget_id(kind, value):
+    """Сбрасывает соответствие, когда ключ может указать на другой объект.
+    """
+    cache.delete(ID_KEY.format(kind, value))
+
+
+def index_scopes(request):
+    return [POSTS_SCOPE, GROUPS_SCOPE]
+
+
+def group_scopes(request, slug):
+    group_id = known_id('group', slug)
+    if group_id is None:
+        return None
+    return [GROUPS_SCOPE, group_scope(group_id)]
+
+
+def profile_scopes(request, username):
+    author_id = known_id('user', username)
+    if author_id is None:
+        return None
+    return [
+        GROUPS_SCOPE,
+        author_scope(author_id),
+        follow_scope(author_id),
+        followers_scope(author_id),
+    ]
+
+
+def follow_scopes(request):
+    if not request.user.is_authenticated:
+        return None
+    return feed_scopes('follow', viewer=request.user)
+
+
+def post_scopes(request, post_id):
+    # Автор поста не меняется, а удаление поста меняет его поколение.
+    author_id = known_id('post', post_id)
+    if author_id is None:
+        return None
+    # Число постов автора на странице меняется вместе с его лентой.
+    return [GROUPS_SCOPE, post_scope(post_id), author_scope(author_id)]
+
+
+def etag_func(scopes_func):
+    """``etag_func`` для ``condition`` по функции областей страницы."""
+    def etag(request, *args, **kwargs):
+        scopes = scopes_func(request, *args, **kwargs)
+        if scopes is None:
+            return None
+        viewer = '-'
+        if request.user.is_authenticated:
+            # Страница с формой содержит CSRF-токен: после нового входа
+            # токен другой, и старая страница не должна отвечать 304.
+            token = request.META.get('CSRF_COOKIE', '')
+            digest = hashlib.sha256(token.encode()).hexdigest()[:16]
+            viewer = f'{request.user.pk}.{digest}'
+        return f'{viewer}-{generation_tag(scopes)}'
+    return etag
+
+
+index_etag = etag_func(index_scopes)
+group_etag = etag_func(group_scopes)
+profile_etag = etag_func(profile_scopes)
+post_etag = etag_func(post_scopes)
+follow_etag = etag_func(follow_scopes)
@@ -0,0 +1,123 @@
+"""Ключи кэша фрагментов лент и области их инвалидации.
+
+Ключ фрагмента собирается из типа ленты, позиции на странице (курсор
+или номер), зрителя — для персональных лент — и номеров поколений
+областей, от которых зависит содержимое. Сигналы моделей переводят
+затронутые области на новое поколение.
+"""
+from django.conf import settings
+
+from core.generations import bump_generation, generation_tag
+
+# Общие области: все посты и всё, что выводится в карточке поста.
+POSTS_SCOPE = 'posts'
+GROUPS_SCOPE = 'groups'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def followers_scope(author_id):
+    return f'followers:{author_id}'
+
+
+def feed_scopes(feed, group=None, author=None, viewer=None):
+    scopes = [GROUPS_SCOPE]
+    if feed == 'group':
+        scopes.append(group_scope(group.pk))
+    elif feed == 'profile':
+        scopes.append(author_scope(author.pk))
+    elif feed == 'follow':
+        scopes.extend([POSTS_SCOPE, follow_scope(viewer.pk)])
+    else:
+        scopes.append(POSTS_SCOPE)
+    return scopes
+
+
+def feed_cache_context(feed, request, group=None, author=None,
+                       viewer=None):
+    """Переменные для ``{% cache %}`` вокруг списка постов ленты."""
+    position = request.GET.get('cursor') or request.GET.get('page') or '1'
+    parts = [
+        feed,
+        position,
+        str(viewer.pk) if viewer is not None else '-',
+        generation_tag(feed_scopes(feed, group, author, viewer)),
+    ]
+    return {
+        'feed_cache_key': ':'.join(parts),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
+
+
+def changed_post_scopes(post, group_ids=()):
+    scopes = [
+        POSTS_SCOPE,
+        author_scope(post.author_id),
+        post_scope(post.pk),
+    ]
+    scopes.extend(
+        group_scope(group_id)
+        for group_id in {post.group_id, *group_ids}
+        if group_id is not None
+    )
+    return scopes
+
+
+def changed_follow_scopes(follow):
+    return [follow_scope(follow.user_id), followers_scope(follow.author_id)]
+
+
+def post_changed(post, group_ids=()):
+    """Инвалидирует ленты и страницу поста."""
+    bump_generation(*changed_post_scopes(post, group_ids))
+
+
+def comment_changed(comment):
+    bump_generation(post_scope(comment.post_id))
+
+
+def group_changed(group):
+    bump_generation(GROUPS_SCOPE, group_scope(group.pk))
+
+
+def author_changed(author, group_ids=(), post_ids=()):
+    """Имя автора выводится в карточках его постов во всех лентах
+    и в его комментариях на страницах постов ``post_ids``.
+    """
+    bump_generation(
+        POSTS_SCOPE,
+        author_scope(author.pk),
+        *(group_scope(group_id) for group_id in group_ids),
+        *(post_scope(post_id) for post_id in post_ids),
+    )
+
+
+def follow_changed(follow):
+    bump_generation(*changed_follow_scopes(follow))
+
+
+def bulk_changed(posts=(), comments=(), follows=()):
+    """Инвалидирует всё, что затронула пачка записей, — каждую область
+    один раз.
+    """
+    scopes = set()
+    for post in posts:
+        scopes.update(changed_post_scopes(post))
+    scopes.update(post_scope(comment.post_id) for comment in comments)
+    for follow in follows:
+        scopes.update(changed_follow_scopes(follow))
+    bump_generation(*scopes)
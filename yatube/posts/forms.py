@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import check_image, fix_extension
 from .models import Post, Group, Comment
 
 
@@ -13,6 +15,18 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            check_image(image)
+            fix_extension(image)
+        return image
+
+    @property
+    def image_uploaded(self):
+        """Сохранит ли форма новый файл картинки."""
+        return isinstance(self.cleaned_data.get('image'), UploadedFile)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
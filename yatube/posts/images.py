@@ -0,0 +1,198 @@
+"""Обработка картинок, загруженных с формой поста.
+
+Загрузка больше ``FILE_UPLOAD_MAX_MEMORY_SIZE`` пишется Django во
+временный файл кусками и не держится в памяти целиком. Форма проверяет
+только заголовок картинки: размер файла и число пикселей, а расширение
+имени берётся из формата картинки. Одинаковые картинки хранятся одним
+файлом (см. ``storage``), уже обработанный файл повторно не
+обрабатывается (см. ``StoredImage``). Уменьшение до ``IMAGE_MAX_SIDE``,
+удаление метаданных и пережатие идут в пуле потоков после сохранения
+поста; обработанная картинка сохраняется новым файлом, посты
+переводятся на него, затем рисуются миниатюры. Файл, на который не
+ссылается ни один пост, удаляется вместе с миниатюрами.
+"""
+import os
+from io import BytesIO
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post, StoredImage
+from .thumbnails import ThumbnailPool, generate_thumbnails
+from .thumbnails import schedule as schedule_thumbnails
+
+EXTENSIONS = {
+    'JPEG': '.jpg',
+    # JPEG с несколькими кадрами (MPF), так Pillow видит многие снимки
+    # с телефонов.
+    'MPO': '.jpg',
+    'PNG': '.png',
+    'GIF': '.gif',
+    'WEBP': '.webp',
+}
+# Эти форматы пережимаются; GIF может быть анимирован и остаётся как есть.
+PROCESSED_EXTENSIONS = ('.jpg', '.png', '.webp')
+# В каком формате сохранять картинку после обработки: из MPO остаётся
+# обычный JPEG с первым кадром.
+SAVE_FORMATS = {'MPO': 'JPEG'}
+
+
+def check_image(upload):
+    """Отклоняет слишком большие файлы и картинки.
+
+    ``upload.image`` — картинка Pillow, которую открыло поле формы.
+    """
+    if upload.size > settings.IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)s',
+            code='file_too_large',
+            params={'limit': filesizeformat(settings.IMAGE_MAX_UPLOAD_SIZE)},
+        )
+    width, height = upload.image.size
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка слишком большая: %(width)s×%(height)s точек',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+
+
+def fix_extension(upload):
+    """Берёт расширение имени загрузки из формата картинки."""
+    image_format = upload.image.format
+    extension = EXTENSIONS.get(image_format, f'.{image_format.lower()}')
+    upload.name = f'{os.path.splitext(upload.name)[0]}{extension}'
+
+
+def save_options(image_format):
+    if image_format == 'JPEG':
+        return {
+            'quality': settings.IMAGE_QUALITY,
+            'optimize': True,
+            'progressive': True,
+        }
+    if image_format == 'WEBP':
+        return {'quality': settings.IMAGE_QUALITY, 'method': 6}
+    return {'optimize': True}
+
+
+def process_file(file):
+    """Уменьшает картинку, убирает метаданные и пережимает её.
+
+    Возвращает содержимое обработанной картинки.
+    """
+    with Image.open(file) as source:
+        image_format = SAVE_FORMATS.get(source.format, source.format)
+        icc_profile = source.info.get('icc_profile')
+        # Поворот из EXIF применяется к точкам, раз сами EXIF удаляются.
+        image = ImageOps.exif_transpose(source)
+    image.thumbnail(
+        (settings.IMAGE_MAX_SIDE, settings.IMAGE_MAX_SIDE), Image.LANCZOS
+    )
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    # Метаданные Pillow берёт из info при сохранении некоторых форматов.
+    image.info = {}
+    options = save_options(image_format)
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    content = BytesIO()
+    image.save(content, image_format, **options)
+    return ContentFile(content.getvalue())
+
+
+def process_image(name):
+    """Обрабатывает сохранённую картинку (см. ``process_file``)."""
+    storage = Post._meta.get_field('image').storage
+    with storage.open(name) as file:
+        return process_file(file)
+
+
+def prepare_upload(content):
+    """Проверяет и сразу обрабатывает картинку, загруженную без формы.
+
+    Проверки те же, что у формы поста; ошибки — ``ValidationError``.
+    Возвращает файл для сохранения и признак того, что он обработан.
+    """
+    forms.ImageField().to_python(content)
+    check_image(content)
+    fix_extension(content)
+    if os.path.splitext(content.name)[1] not in PROCESSED_EXTENSIONS:
+        return content, False
+    try:
+        processed = process_file(content)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise ValidationError(
+            'Не удалось обработать картинку', code='invalid_image'
+        )
+    processed.name = content.name
+    return processed, True
+
+
+def prepare_image(name):
+    """Сохраняет обработанную картинку отдельным файлом под хешем её
+    содержимого и переводит на него посты, затем рисует миниатюры.
+    """
+    content = process_image(name)
+    storage = Post._meta.get_field('image').storage
+    processed = storage.content_name(name, content)
+    with transaction.atomic():
+        StoredImage.objects.lock(processed)
+        StoredImage.objects.filter(name=processed).update(processed=True)
+        storage.save(processed, content)
+        if processed != name:
+            # Сохранение поста сбрасывает кэши его лент и освобождает
+            # исходный файл (см. ``signals``).
+            for post in Post.objects.filter(image=name):
+                post.image = processed
+                post.save(update_fields=['image', 'updated'])
+    if Post.objects.filter(image=processed).exists():
+        generate_thumbnails(processed)
+    # Посты могли удалить, пока картинка обрабатывалась.
+    release(name)
+    release(processed)
+
+
+pool = ThumbnailPool(prepare_image, thread_name_prefix='images')
+
+
+def release(name):
+    """Удаляет файл и его миниатюры после фиксации транзакции, если на
+    него больше не ссылается ни один пост.
+    """
+    def delete():
+        # Под блокировкой строки файла новая ссылка на него не появится,
+        # пока он удаляется (см. ``Post.save``).
+        with transaction.atomic():
+            StoredImage.objects.lock(name)
+            if Post.objects.filter(image=name).exists():
+                return
+            StoredImage.objects.filter(name=name).delete()
+            storage = Post._meta.get_field('image').storage
+            default.kvstore.delete(ImageFile(name, storage))
+            storage.delete(name)
+
+    if name:
+        transaction.on_commit(delete)
+
+
+def schedule(image, process=False):
+    """Ставит новую необработанную картинку в очередь на обработку после
+    фиксации транзакции, остальные — сразу на миниатюры.
+    """
+    if not image:
+        return
+    name = image.name
+    if (process and os.path.splitext(name)[1] in PROCESSED_EXTENSIONS
+            and StoredImage.objects.filter(
+                name=name, processed=False).exists()):
+        transaction.on_commit(lambda: pool.submit(name))
+    else:
+        schedule_thumbnails(image)
@@ -0,0 +1,96 @@
+"""Хранилище метаданных миниатюр sorl-thumbnail в локальном файле SQLite.
+
+Стандартное хранилище держит метаданные в кэше Django, и после
+перезапуска каждый процесс заново проверяет, какие миниатюры уже есть.
+Файл SQLite в режиме WAL переживает перезапуски и общий для всех
+процессов на машине, а ``get_many`` находит все миниатюры страницы одним
+запросом.
+"""
+import os
+import sqlite3
+import threading
+
+from django.conf import settings
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+
+# Сколько ключей подставлять в один запрос ``IN (...)``: у SQLite
+# есть предел числа параметров.
+LOOKUP_BATCH_SIZE = 500
+
+
+class KVStore(KVStoreBase):
+    """Подключается через ``THUMBNAIL_KVSTORE``."""
+
+    def __init__(self):
+        super().__init__()
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        # Соединение SQLite не переживает fork и не делится между
+        # потоками, поэтому держим своё на каждый поток каждого процесса;
+        # путь проверяем на случай смены настроек.
+        path = settings.THUMBNAIL_KVSTORE_PATH
+        connection = getattr(self._local, 'connection', None)
+        if (connection is None or self._local.pid != os.getpid()
+                or self._local.path != path):
+            connection = sqlite3.connect(
+                path, timeout=settings.THUMBNAIL_KVSTORE_TIMEOUT,
+                isolation_level=None,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS kvstore '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL)'
+            )
+            self._local.connection = connection
+            self._local.path = path
+            self._local.pid = os.getpid()
+        return connection
+
+    def get_many(self, image_files):
+        """Словарь ``{ключ файла: миниатюра}`` для найденных файлов."""
+        raw_keys = {
+            add_prefix(image_file.key): image_file.key
+            for image_file in image_files
+        }
+        found = {}
+        keys = list(raw_keys)
+        for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+            batch = keys[start:start + LOOKUP_BATCH_SIZE]
+            rows = self.connection.execute(
+                'SELECT key, value FROM kvstore WHERE key IN ({})'.format(
+                    ', '.join('?' * len(batch))
+                ),
+                batch,
+            )
+            for raw_key, value in rows:
+                found[raw_keys[raw_key]] = deserialize_image_file(value)
+        return found
+
+    def _get_raw(self, key):
+        row = self.connection.execute(
+            'SELECT value FROM kvstore WHERE key = ?', [key]
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_raw(self, key, value):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO kvstore (key, value) VALUES (?, ?)',
+            [key, value],
+        )
+
+    def _delete_raw(self, *keys):
+        self.connection.executemany(
+            'DELETE FROM kvstore WHERE key = ?', [[key] for key in keys]
+        )
+
+    def _find_keys_raw(self, prefix):
+        # LIKE в SQLite не различает регистр, поэтому сравниваем начало.
+        rows = self.connection.execute(
+            'SELECT key FROM kvstore WHERE substr(key, 1, ?) = ?',
+            [len(prefix), prefix],
+        )
+        return [key for key, in rows]
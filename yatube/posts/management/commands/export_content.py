@@ -0,0 +1,48 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import EXPORT_SOURCES, FORMATS, export_stream
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает подписки, посты и комментарии в NDJSON (формат '
+        'import_content) или одну таблицу в CSV, не держа их в памяти.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=FORMATS, default='ndjson',
+            dest='export_format',
+        )
+        parser.add_argument(
+            '--models', default=','.join(EXPORT_SOURCES),
+            help='Таблицы через запятую: ' + ', '.join(EXPORT_SOURCES),
+        )
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжать выгрузку gzip.'
+        )
+        parser.add_argument(
+            '--output', default='-', help='Файл; «-» — стандартный вывод.'
+        )
+
+    def handle(self, *args, export_format, models, gzip, output, **options):
+        names = models.split(',')
+        unknown = [name for name in names if name not in EXPORT_SOURCES]
+        if unknown:
+            raise CommandError(f'Неизвестные таблицы: {", ".join(unknown)}')
+        try:
+            chunks = export_stream(names, export_format, gzip)
+        except ValueError as error:
+            raise CommandError(error)
+        if output == '-':
+            file = sys.stdout.buffer
+        else:
+            file = open(output, 'wb')
+        try:
+            for chunk in chunks:
+                file.write(chunk)
+        finally:
+            if output != '-':
+                file.close()
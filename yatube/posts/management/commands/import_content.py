@@ -0,0 +1,64 @@
+import json
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.bulk import BulkImporter, BulkImportError
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты, комментарии и подписки из файла NDJSON: '
+        'по записи на строку (формат — в posts.bulk).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл с записями; «-» — стандартный ввод.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=None,
+            help='Сколько записей загружать за одну транзакцию.',
+        )
+        parser.add_argument(
+            '--images', default=None,
+            help='Каталог, от которого отсчитываются пути картинок постов.',
+        )
+
+    def handle(self, *args, path, chunk_size, images, **options):
+        open_image = None
+        if images is not None:
+            def open_image(name):
+                # Картинки не должны выходить за пределы каталога.
+                root = os.path.realpath(images)
+                full_path = os.path.realpath(os.path.join(root, name))
+                if os.path.commonpath([root, full_path]) != root:
+                    raise OSError(name)
+                return open(full_path, 'rb')
+
+        importer = BulkImporter(
+            open_image=open_image,
+            chunk_size=chunk_size,
+            progress=lambda stats: self.stdout.write(f'Загружено {stats}'),
+        )
+        file = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        try:
+            stats = importer.run(self.read_records(file))
+        except BulkImportError as error:
+            raise CommandError(
+                f'{error}. Загружено до ошибки: {importer.stats}'
+            )
+        finally:
+            if file is not sys.stdin:
+                file.close()
+        self.stdout.write(self.style.SUCCESS(f'Готово: {stats}'))
+
+    def read_records(self, file):
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as error:
+                raise CommandError(f'Строка {number}: {error}')
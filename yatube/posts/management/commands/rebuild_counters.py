@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import rebuild_user_counters
+from posts.models import FeedCounter, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики пользователей и сбрасывает счётчики лент, '
+        'если они разошлись с данными.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько пользователей пересчитывать за одну транзакцию.',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        fixed = 0
+        last_pk = 0
+        while True:
+            user_ids = list(
+                User.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not user_ids:
+                break
+            last_pk = user_ids[-1]
+            with transaction.atomic():
+                fixed += rebuild_user_counters(user_ids)
+        # Счётчики лент заводятся заново точным подсчётом при чтении.
+        dropped, _ = FeedCounter.objects.all().delete()
+        self.stdout.write(
+            f'Исправлено счётчиков пользователей: {fixed}, '
+            f'сброшено счётчиков лент: {dropped}'
+        )
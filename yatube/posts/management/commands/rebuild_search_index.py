@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post
+from posts.search import index_posts, is_supported
+
+
+class Command(BaseCommand):
+    help = (
+        'Заново добавляет все посты в поисковый индекс, например после '
+        'миграции, которая создала пустой индекс.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько постов индексировать за одну транзакцию.',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        if not is_supported():
+            self.stdout.write('Поисковый индекс есть только у SQLite')
+            return
+        indexed = 0
+        last_pk = 0
+        while True:
+            posts = list(
+                Post.objects.filter(pk__gt=last_pk).order_by('pk')
+                .only('pk', 'text')[:batch_size]
+            )
+            if not posts:
+                break
+            last_pk = posts[-1].pk
+            with transaction.atomic():
+                index_posts(posts)
+            indexed += len(posts)
+        self.stdout.write(f'Проиндексировано постов: {indexed}')
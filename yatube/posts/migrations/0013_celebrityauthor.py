@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-18 00:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0012_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CelebrityAuthor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('promoted', models.DateTimeField(auto_now_add=True)),
+                ('followers_at_promotion', models.PositiveIntegerField()),
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='celebrity', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
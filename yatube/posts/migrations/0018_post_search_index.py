@@ -0,0 +1,36 @@
+from django.db import migrations
+
+SEARCH_TABLE = 'posts_post_fts'
+
+
+def create_search_index(apps, schema_editor):
+    # Индекс FTS5 есть только у SQLite; на других СУБД поиск идёт
+    # по подстроке без индекса.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    # Таблица создаётся пустой: существующие посты добавляет команда
+    # rebuild_search_index, чтобы миграция не зависела от текущего
+    # кода поиска.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} '
+            "USING fts5(body, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_comment_thread_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,13 +1,67 @@
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Substr
 from django.contrib.auth import get_user_model
 
+from .storage import ContentAddressedStorage
+
 
 User = get_user_model()
 
+# Столбцы, которые нужны карточке поста в ленте. Полный текст и
+# остальные столбцы автора (в том числе хеш пароля) в ленту не грузятся.
+FEED_FIELDS = (
+    'pub_date', 'updated', 'image', 'author', 'group',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__slug',
+)
+
+
+class PostQuerySet(models.QuerySet):
+    """Выборки постов для лент: связанные автор и группа всегда
+    приходят тем же запросом, что и посты.
+    """
+
+    def feed(self):
+        """Только столбцы карточки и начало текста в ``text_preview``
+        (на символ длиннее превью, чтобы было видно, что текст обрезан).
+        Полный ``text`` догружается при обращении к нему.
+        """
+        return (
+            self.select_related('author', 'group')
+            .only(*FEED_FIELDS)
+            .annotate(text_preview=Substr(
+                'text', 1, settings.POST_PREVIEW_LENGTH + 1
+            ))
+        )
+
+    def for_index(self):
+        return self.feed()
+
+    def for_group(self, group):
+        return self.filter(group=group).feed()
+
+    def for_author(self, author):
+        return self.filter(author=author).feed()
+
+    def for_follower(self, user):
+        """Все посты ленты подписок: разложенные по ``TimelineEntry``
+        и посты «звёзд», которые подмешиваются при чтении.
+        """
+        pushed = TimelineEntry.objects.filter(user=user).values('post_id')
+        celebrities = Follow.objects.filter(
+            user=user, author__celebrity__isnull=False
+        ).values('author_id')
+        return self.filter(
+            models.Q(pk__in=pushed) | models.Q(author_id__in=celebrities)
+        ).feed()
+
 
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
+    # Время последнего изменения: входит в ключ кэша карточки поста.
+    updated = models.DateTimeField(auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -25,17 +79,81 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        blank=True,
+        # Одинаковые картинки хранятся одним файлом, а индекс нужен,
+        # чтобы при удалении поста проверить, нужен ли файл другим.
+        storage=ContentAddressedStorage(),
+        db_index=True,
     )
     # Аргумент upload_to указывает директорию,
     # в которую будут загружаться пользовательские файлы.
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ['pub_date']
+        # Индексы под каждую ленту: общую, автора и группы. Порядок
+        # полей совпадает с ключом пагинации (pub_date, id), поэтому
+        # страница читается по индексу без сортировки.
+        indexes = [
+            models.Index(fields=['pub_date', 'id'],
+                         name='post_feed_idx'),
+            models.Index(fields=['author', 'pub_date', 'id'],
+                         name='post_author_feed_idx'),
+            models.Index(fields=['group', 'pub_date', 'id'],
+                         name='post_group_feed_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        if not self.image or self.image._committed:
+            return super().save(*args, **kwargs)
+        # Новая картинка: хранилище вернёт уже сохранённый файл или
+        # запишет его заново. Строка файла заблокирована до фиксации,
+        # чтобы ``images.release`` не удалил файл, на который вот-вот
+        # сошлётся этот пост.
+        field = self._meta.get_field('image')
+        name = field.storage.content_name(
+            field.generate_filename(self, self.image.name), self.image
+        )
+        with transaction.atomic():
+            StoredImage.objects.lock(name)
+            return super().save(*args, **kwargs)
+
+
+class StoredImageManager(models.Manager):
+    def lock(self, name):
+        """Блокирует строку файла до конца транзакции, создавая её при
+        необходимости. UPDATE берёт блокировку и на SQLite, где
+        ``select_for_update`` ничего не делает.
+        """
+        if self.filter(name=name).update(name=name):
+            return
+        try:
+            with transaction.atomic():
+                self.create(name=name)
+        except IntegrityError:
+            # Строку только что создал другой процесс.
+            self.filter(name=name).update(name=name)
+
+
+class StoredImage(models.Model):
+    """Файл картинки постов в хранилище с адресацией по содержимому.
+
+    Сохранение поста с новой картинкой и удаление файла без ссылок
+    блокируют эту строку, поэтому не пересекаются.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    # Картинка уже уменьшена и пережата, повторно её обрабатывать не надо.
+    processed = models.BooleanField(default=False)
+
+    objects = StoredImageManager()
+
+    def __str__(self):
+        return self.name
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
@@ -54,6 +172,13 @@ class Comment(models.Model):
     text = models.TextField()
     created = models.DateTimeField("Дата публикации", auto_now_add=True)
 
+    class Meta:
+        # Ключ постраничного вывода комментариев к посту.
+        indexes = [
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comment_thread_idx'),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -63,4 +188,75 @@ class Follow(models.Model):
                              related_name='follower',
                              verbose_name='Пользователь подписан на')
     author = models.ForeignKey(User, on_delete=models.CASCADE,
-                               related_name='following', verbose_name='Автора')
\ No newline at end of file
+                               related_name='following', verbose_name='Автора')
+
+    class Meta:
+        # Уникальный индекс заодно служит для поиска подписки по паре.
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписчика."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    # Автор и дата поста продублированы, чтобы листать ленту
+    # и чистить её при отписке без обращения к таблице постов.
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='+')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_post'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'pub_date', 'post'],
+                         name='timeline_user_feed_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+
+
+class CelebrityAuthor(models.Model):
+    """Автор, чьи посты не раскладываются по лентам подписчиков,
+    а подмешиваются в ленту при чтении.
+    """
+    author = models.OneToOneField(User, on_delete=models.CASCADE,
+                                  related_name='celebrity')
+    promoted = models.DateTimeField(auto_now_add=True)
+    followers_at_promotion = models.PositiveIntegerField()
+
+    def __str__(self):
+        return str(self.author)
+
+
+class FeedCounter(models.Model):
+    """Число постов в ленте: общей, группы или автора."""
+    key = models.CharField(max_length=64, unique=True)
+    value = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.key}: {self.value}'
+
+
+class UserCounters(models.Model):
+    """Денормализованные счётчики пользователя для профиля и страницы
+    поста. Сдвигаются сигналами, пересчитываются командой
+    ``rebuild_counters``.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name='counters')
+    posts_count = models.IntegerField(default=0)
+    # Сколько пользователей подписано на него и на скольких он сам.
+    followers_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+    comments_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return str(self.user)
@@ -0,0 +1,101 @@
+"""Кэш целых страниц для анонимных посетителей.
+
+Страница лежит в кэше под ключом из пути с параметрами вместе с номерами
+поколений областей, от которых она зависит (те же области, что у ETag).
+Сигналы моделей переводят на новое поколение только затронутые области,
+поэтому новый пост сбрасывает главную, ленту своей группы и профиль
+автора, а комментарий — только страницу поста.
+
+Сброшенная страница не удаляется из кэша. Если включён режим
+stale-while-revalidate, новую версию рисует один запрос, а остальные,
+пока он работает, получают прежнюю, так что сброс популярной страницы
+не оборачивается лавиной одинаковых запросов к базе.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import metrics
+from core.generations import generation_tag
+
+PAGE_KEY = 'page:{}'
+REFRESH_KEY = 'page-refresh:{}'
+
+
+def page_key(request):
+    # В пути и параметрах могут быть символы, недопустимые в ключах.
+    path = request.get_full_path().encode()
+    return hashlib.md5(path).hexdigest()
+
+
+def is_cacheable(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        # Токен CSRF в странице у каждого посетителя свой.
+        and not request.META.get('CSRF_COOKIE_USED')
+    )
+
+
+def lookup(key, tag):
+    """Страница из кэша и признак того, что этот запрос её обновляет.
+
+    Возвращает ``(None, refreshing)``, если страницу надо нарисовать.
+    """
+    entry = cache.get(PAGE_KEY.format(key))
+    if entry is None:
+        return None, False
+    entry_tag, response = entry
+    if entry_tag == tag:
+        metrics.incr('page_cache_hits_total')
+        return response, False
+    if not settings.PAGE_CACHE_STALE_WHILE_REVALIDATE:
+        return None, False
+    refreshing = cache.add(
+        REFRESH_KEY.format(key), time.time(),
+        settings.PAGE_CACHE_REFRESH_TIMEOUT,
+    )
+    if refreshing:
+        return None, True
+    # Новую версию уже рисует другой запрос.
+    metrics.incr('page_cache_stale_hits_total')
+    return response, False
+
+
+def cache_anonymous_page(scopes_func):
+    """Декоратор view, которая кэширует страницу для анонимов.
+
+    ``scopes_func`` принимает аргументы view и возвращает области
+    страницы или None, если их пока нельзя узнать без запроса к базе.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            scopes = scopes_func(request, *args, **kwargs)
+            if scopes is None:
+                return view(request, *args, **kwargs)
+            tag = generation_tag(scopes)
+            key = page_key(request)
+            response, refreshing = lookup(key, tag)
+            if response is not None:
+                return response
+            metrics.incr('page_cache_misses_total')
+            try:
+                response = view(request, *args, **kwargs)
+                if is_cacheable(request, response):
+                    cache.set(
+                        PAGE_KEY.format(key), (tag, response),
+                        settings.PAGE_CACHE_TIMEOUT,
+                    )
+            finally:
+                if refreshing:
+                    cache.delete(REFRESH_KEY.format(key))
+            return response
+        return wrapper
+    return decorator
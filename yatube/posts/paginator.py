@@ -0,0 +1,275 @@
+"""Постраничный вывод лент по ключу сортировки (keyset/cursor pagination).
+
+Вместо ``OFFSET n LIMIT k`` очередная страница выбирается условием
+по ключу ``(pub_date, id)`` крайней показанной записи, поэтому глубокие
+страницы стоят столько же, сколько первая, а ``COUNT(*)`` не выполняется.
+Позиция передаётся в адресе непрозрачным подписанным токеном ``?cursor=``.
+"""
+from django.core import signing
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+CURSOR_SALT = 'posts.paginator.cursor'
+FORWARD = 'n'
+BACKWARD = 'p'
+# Номер страницы в ``?page=``, который открывает последнюю страницу
+# чтением ленты с конца, без смещения.
+LAST_PAGE = 'last'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage(Page):
+    """Страница ленты, которая знает соседние курсоры, но не общее число."""
+    window_on_each_side = 2
+    window_on_ends = 1
+
+    def __init__(self, object_list, number, paginator,
+                 next_cursor=None, previous_cursor=None):
+        super().__init__(object_list, number, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<CursorPage %s>' % self.number
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return self.paginator.per_page * (self.number - 1) + 1
+
+    def end_index(self):
+        if not self.object_list:
+            return 0
+        return self.start_index() + len(self.object_list) - 1
+
+    @property
+    def page_window(self):
+        """Номера страниц вокруг текущей, пропуски отмечены ``None``.
+
+        Окно строится только если паджинатору передано готовое число
+        записей, и его размер не зависит от длины ленты.
+        """
+        if not self.paginator.count_known:
+            return []
+        on_each_side = self.window_on_each_side
+        on_ends = self.window_on_ends
+        number = self.number
+        # Число записей бывает примерным, страница не может быть за концом.
+        num_pages = max(
+            self.paginator.num_pages, number + int(self.has_next())
+        )
+        if num_pages <= (on_each_side + on_ends) * 2:
+            return list(range(1, num_pages + 1))
+        window = []
+        if number > 1 + on_each_side + on_ends + 1:
+            window.extend(range(1, on_ends + 1))
+            window.append(None)
+            window.extend(range(number - on_each_side, number + 1))
+        else:
+            window.extend(range(1, number + 1))
+        if number < num_pages - on_each_side - on_ends - 1:
+            window.extend(range(number + 1, number + on_each_side + 1))
+            window.append(None)
+            window.extend(range(num_pages - on_ends + 1, num_pages + 1))
+        else:
+            window.extend(range(number + 1, num_pages + 1))
+        return window
+
+
+class CursorPaginator(Paginator):
+    """Paginator, который листает queryset по ключу ``ordering``.
+
+    Поля ключа перечисляются как в ``order_by()``, последнее поле должно
+    быть уникальным (обычно ``pk``), чтобы порядок был однозначным.
+    ``count`` и ``num_pages`` по-прежнему доступны, но вычисляются только
+    при явном обращении, если число записей не передано в ``count``
+    (например, из счётчиков ленты).
+    """
+
+    def __init__(self, object_list, per_page, ordering=('pub_date', 'pk'),
+                 count=None, **kwargs):
+        self.ordering = tuple(ordering)
+        if hasattr(object_list, 'order_by'):
+            object_list = object_list.order_by(*self.ordering)
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_known = count is not None
+        if self.count_known:
+            # Заполняем cached_property, чтобы не выполнять COUNT(*).
+            self.__dict__['count'] = count
+
+    @property
+    def key_fields(self):
+        return [
+            (field.lstrip('-'), field.startswith('-'))
+            for field in self.ordering
+        ]
+
+    def get_key(self, obj):
+        """Значения ключа сортировки для объекта ленты."""
+        return [getattr(obj, name) for name, _ in self.key_fields]
+
+    def encode_cursor(self, direction, number, obj):
+        values = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in self.get_key(obj)
+        ]
+        return signing.dumps(
+            [direction, number, values], salt=CURSOR_SALT, compress=True
+        )
+
+    def decode_cursor(self, cursor):
+        try:
+            direction, number, values = signing.loads(cursor, salt=CURSOR_SALT)
+            number = int(number)
+        except (signing.BadSignature, TypeError, ValueError):
+            raise InvalidCursor(cursor)
+        if direction not in (FORWARD, BACKWARD):
+            raise InvalidCursor(cursor)
+        if len(values) != len(self.ordering):
+            raise InvalidCursor(cursor)
+        try:
+            values = self.parse_key(values)
+        except Exception:
+            raise InvalidCursor(cursor)
+        return direction, max(number, 1), values
+
+    def parse_key(self, values):
+        """Значения ключа из курсора, приведённые к типам полей."""
+        opts = self.object_list.model._meta
+        return [
+            (opts.pk if name == 'pk' else opts.get_field(name))
+            .to_python(value)
+            for (name, _), value in zip(self.key_fields, values)
+        ]
+
+    def keyset_filter(self, values, forward=True, key_fields=None):
+        """Условие «строго после ключа» (при ``forward=False`` — «до»).
+
+        ``(a, b) > (x, y)`` раскрывается в ``a >= x AND (a > x OR
+        (a = x AND b > y))``: нестрогое условие на первое поле позволяет
+        СУБД начать чтение составного индекса прямо с ключа, а не
+        просматривать его с начала. ``key_fields`` позволяет наложить
+        тот же ключ на поля другой модели, например записей ленты.
+        """
+        condition = Q()
+        equal = {}
+        key_fields = key_fields or self.key_fields
+        for (name, descending), value in zip(key_fields, values):
+            lookup = 'gt' if forward != descending else 'lt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        (name, descending), value = key_fields[0], values[0]
+        lookup = 'gte' if forward != descending else 'lte'
+        return Q(**{f'{name}__{lookup}': value}) & condition
+
+    def fetch(self, values, forward, limit):
+        """Первые ``limit`` объектов после ключа в направлении обхода.
+
+        Для обхода назад объекты возвращаются в обратном порядке.
+        Наследники могут переопределить метод, чтобы собирать ленту
+        не из одного queryset.
+        """
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self.keyset_filter(values, forward))
+        if not forward:
+            queryset = queryset.reverse()
+        return list(queryset[:limit])
+
+    def get_cursor_page(self, cursor=None):
+        """Страница по курсору; без курсора или с битым курсором — первая."""
+        direction, number, values = FORWARD, 1, None
+        if cursor:
+            try:
+                direction, number, values = self.decode_cursor(cursor)
+            except InvalidCursor:
+                pass
+        forward = direction == FORWARD
+        rows = self.fetch(values, forward, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if forward:
+            has_next, has_previous = has_more, values is not None
+        else:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+            if not rows:
+                return self.get_cursor_page()
+        if not has_previous:
+            number = 1
+        return self.build_page(rows, number, has_next, has_previous)
+
+    def get_page(self, number):
+        """Совместимость со старыми ссылками ``?page=N``.
+
+        Страница выбирается смещением, но без предварительного ``COUNT(*)``:
+        признак следующей страницы даёт лишняя прочитанная строка.
+        ``LAST_PAGE`` открывает последнюю страницу (см. ``get_last_page``).
+        """
+        if number == LAST_PAGE:
+            return self.get_last_page()
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            return self.get_cursor_page()
+        if number <= 1:
+            return self.get_cursor_page()
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows:
+            # Как и Paginator.get_page, за пределами ленты отдаём последнюю
+            # страницу.
+            return self.get_last_page()
+        has_next = len(rows) > self.per_page
+        return self.build_page(
+            rows[:self.per_page], number, has_next, number > 1
+        )
+
+    def get_last_page(self):
+        """Последняя страница ленты, прочитанная с конца.
+
+        На ней, как и при листании смещением, остаток записей после
+        полных страниц, поэтому номера и курсор «назад» совпадают
+        с ``?page=N``. Номер и размер страницы берутся из ``count``:
+        без переданного числа записей здесь выполняется подсчёт.
+        """
+        number = max(self.num_pages, 1)
+        limit = self.count - (number - 1) * self.per_page
+        if limit <= 0:
+            limit = self.per_page
+        rows = self.fetch(None, False, limit + 1)
+        has_previous = len(rows) > limit
+        rows = rows[:limit]
+        rows.reverse()
+        if not has_previous:
+            number = 1
+        return self.build_page(rows, number, False, has_previous)
+
+    def build_page(self, rows, number, has_next, has_previous):
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(FORWARD, number + 1, rows[-1])
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(
+                BACKWARD, number - 1, rows[0]
+            )
+        return CursorPage(
+            rows, number, self,
+            next_cursor=next_cursor,
+            previous_cursor=previous_cursor,
+        )
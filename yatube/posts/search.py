@@ -0,0 +1,225 @@
+"""Полнотекстовый поиск по постам.
+
+Индекс — виртуальная таблица SQLite FTS5 ``posts_post_fts``: в ней
+под ``rowid``, равным id поста, лежит текст поста, приведённый к основам
+слов стеммером Snowball для русского языка. Запрос приводится к основам
+тем же стеммером, поэтому «котами» находит «кот» и «коты». Сигналы
+``Post`` обновляют запись индекса при каждом сохранении и удалении.
+
+Результаты упорядочены по релевантности (BM25) и листаются курсором по
+``(rank, id)``. На других СУБД индекса нет, и поиск сводится к
+``icontains`` по тексту.
+"""
+import re
+
+from django.db import connection
+
+from .models import Post
+from .paginator import CursorPaginator
+
+SEARCH_TABLE = 'posts_post_fts'
+WORD = re.compile(r'\w+')
+
+VOWELS = 'аеиоуыэюя'
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    (),
+    ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+     'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+     'ая', 'яя', 'ою', 'ею'),
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = (
+    (),
+    ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+     'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+     'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+     'ья', 'я'),
+)
+DERIVATIONAL = ('ост', 'ость')
+SUPERLATIVE = ((), ('ейш', 'ейше'))
+
+
+def _remove_ending(word, endings):
+    """Отрезает самое длинное окончание из ``endings``.
+
+    ``endings`` — пара групп: окончания первой должны идти после «а»
+    или «я», которые при этом остаются. Возвращает слово и признак того,
+    что окончание нашлось.
+    """
+    after_a, plain = endings
+    best = 0
+    for ending in after_a:
+        if (len(ending) > best and word.endswith(ending)
+                and word[:-len(ending)][-1:] in ('а', 'я')):
+            best = len(ending)
+    for ending in plain:
+        if len(ending) > best and word.endswith(ending):
+            best = len(ending)
+    if not best:
+        return word, False
+    return word[:-best], True
+
+
+def _region_start(word, start):
+    """Начало области после первого сочетания «гласная, согласная»."""
+    for i in range(start + 1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def stem(word):
+    """Основа русского слова по алгоритму Snowball."""
+    word = word.lower().replace('ё', 'е')
+    rv = next(
+        (i + 1 for i, char in enumerate(word) if char in VOWELS), len(word)
+    )
+    r2 = _region_start(word, _region_start(word, 0))
+    # Окончания ищутся только в области RV, после первой гласной.
+    prefix, word = word[:rv], word[rv:]
+
+    word, found = _remove_ending(word, PERFECTIVE_GERUND)
+    if not found:
+        word, _ = _remove_ending(word, REFLEXIVE)
+        word, found = _remove_ending(word, ADJECTIVE)
+        if found:
+            word, _ = _remove_ending(word, PARTICIPLE)
+        else:
+            word, found = _remove_ending(word, VERB)
+            if not found:
+                word, _ = _remove_ending(word, NOUN)
+    if word.endswith('и'):
+        word = word[:-1]
+    for ending in DERIVATIONAL:
+        if word.endswith(ending) and rv + len(word) - len(ending) >= r2:
+            word = word[:-len(ending)]
+            break
+    word, found = _remove_ending(word, SUPERLATIVE)
+    if word.endswith('нн'):
+        word = word[:-1]
+    elif not found and word.endswith('ь'):
+        word = word[:-1]
+    return prefix + word
+
+
+def stems(text):
+    return [stem(word) for word in WORD.findall(text)]
+
+
+def is_supported():
+    return connection.vendor == 'sqlite'
+
+
+def index_post(post):
+    """Добавляет пост в индекс или обновляет его запись."""
+    index_posts([post])
+
+
+def index_posts(posts):
+    """Как ``index_post``, но для пачки постов."""
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+            [[post.pk] for post in posts],
+        )
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, body) VALUES (%s, %s)',
+            [[post.pk, ' '.join(stems(post.text))] for post in posts],
+        )
+
+
+def unindex_post(post):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [post.pk]
+        )
+
+
+def match_expression(query):
+    """Запрос FTS5: все основы слов запроса в кавычках, через И.
+
+    Кавычки не дают пользователю передать операторы FTS5.
+    """
+    return ' '.join(f'"{word}"' for word in stems(query))
+
+
+class SearchPaginator(CursorPaginator):
+    """Результаты поиска по индексу FTS5, самые релевантные первыми.
+
+    Ключ курсора — ``(rank, id)``, где ``rank`` — оценка BM25 (чем
+    меньше, тем лучше). Оценка зависит от статистики всего индекса,
+    поэтому новые посты между страницами могут немного сдвинуть выдачу.
+    ``object_list`` задаёт только выборку постов по найденным id.
+    """
+
+    def __init__(self, object_list, per_page, query='', **kwargs):
+        self.match = match_expression(query)
+        kwargs['ordering'] = ('search_rank', 'pk')
+        super().__init__(object_list, per_page, **kwargs)
+
+    def get_key(self, obj):
+        return [obj.search_rank, obj.pk]
+
+    def parse_key(self, values):
+        rank, pk = values
+        return [float(rank), int(pk)]
+
+    def fetch(self, values, forward, limit):
+        if not self.match:
+            return []
+        sql = (
+            f'SELECT rowid, rank FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s'
+        )
+        params = [self.match]
+        if values is not None:
+            rank, pk = values
+            sign = '>' if forward else '<'
+            sql += f' AND (rank {sign} %s OR (rank = %s AND rowid {sign} %s))'
+            params.extend([rank, rank, pk])
+        order = '' if forward else ' DESC'
+        sql += f' ORDER BY rank{order}, rowid{order} LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            ranks = dict(cursor.fetchall())
+        posts = self.object_list.order_by().in_bulk(list(ranks))
+        found = []
+        for pk, rank in ranks.items():
+            if pk in posts:
+                posts[pk].search_rank = rank
+                found.append(posts[pk])
+        return found
+
+
+def search_paginator(query, per_page):
+    """Паджинатор результатов поиска по тексту постов.
+
+    На СУБД без индекса — поиск по подстроке, новые посты первыми.
+    """
+    posts = Post.objects.feed()
+    if is_supported():
+        return SearchPaginator(posts, per_page, query=query)
+    return CursorPaginator(
+        posts.filter(text__icontains=query), per_page,
+        ordering=('-pub_date', '-pk'),
+    )
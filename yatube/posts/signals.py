@@ -0,0 +1,154 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, etags, feed_cache, images, search, timeline
+from .models import Comment, Follow, Group, Post, User
+
+# Поля пользователя, которые выводятся в карточках его постов и в его
+# комментариях; отключение пользователя тоже меняет эти страницы.
+AUTHOR_FIELDS = ('username', 'first_name', 'last_name', 'is_active')
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_post(sender, instance, **kwargs):
+    """Запоминаем прежние группу и картинку поста, чтобы перенести его
+    счётчик и освободить заменённый файл.
+    """
+    instance._previous_group_id = None
+    instance._previous_image = ''
+    if instance.pk is not None:
+        instance._previous_group_id, instance._previous_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image').first()
+            or (None, '')
+        )
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    feed_cache.post_changed(instance, [previous_group_id])
+    search.index_post(instance)
+    previous_image = getattr(instance, '_previous_image', '')
+    if previous_image != instance.image.name:
+        images.release(previous_image)
+    if created:
+        counters.adjust_feed_counts(counters.post_feed_keys(instance), 1)
+        counters.adjust_user_counters(instance.author_id, posts_count=1)
+        timeline.fan_out_post(instance)
+        return
+    if previous_group_id != instance.group_id:
+        if previous_group_id is not None:
+            counters.adjust_feed_counts(
+                [counters.feed_key(group=previous_group_id)], -1
+            )
+        if instance.group_id is not None:
+            counters.adjust_feed_counts(
+                [counters.feed_key(group=instance.group_id)], 1
+            )
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.adjust_feed_counts(counters.post_feed_keys(instance), -1)
+    counters.adjust_user_counters(instance.author_id, posts_count=-1)
+    timeline.forget_first_posts(instance.author_id)
+    feed_cache.post_changed(instance)
+    search.unindex_post(instance)
+    images.release(instance.image.name)
+
+
+@receiver(post_delete, sender=Group)
+def drop_group_counter(sender, instance, **kwargs):
+    counters.drop_feed_count(counters.feed_key(group=instance))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    feed_cache.group_changed(instance)
+    # Slug мог перейти к этой группе от другой.
+    etags.forget_id('group', instance.slug)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment(sender, instance, **kwargs):
+    feed_cache.comment_changed(instance)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust_user_counters(instance.author_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.adjust_user_counters(instance.author_id, comments_count=-1)
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_names(sender, instance, update_fields=None, **kwargs):
+    """Запоминаем прежние имя и логин пользователя: они выводятся
+    в карточках его постов и в комментариях, логин служит ключом профиля
+    в ETag.
+    """
+    instance._previous_names = None
+    # Сохранение только других полей (например, last_login при входе)
+    # имён не меняет.
+    if instance.pk is None or (
+            update_fields is not None
+            and not set(AUTHOR_FIELDS) & set(update_fields)):
+        return
+    instance._previous_names = (
+        User.objects.filter(pk=instance.pk)
+        .values_list(*AUTHOR_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_username(sender, instance, **kwargs):
+    etags.forget_id('user', instance.username)
+    previous = getattr(instance, '_previous_names', None)
+    current = tuple(getattr(instance, name) for name in AUTHOR_FIELDS)
+    if previous is None or previous == current:
+        return
+    etags.forget_id('user', previous[0])
+    feed_cache.author_changed(
+        instance,
+        Post.objects.filter(author=instance, group__isnull=False)
+        .values_list('group_id', flat=True).distinct(),
+        Comment.objects.filter(author=instance)
+        .values_list('post_id', flat=True).distinct(),
+    )
+
+
+@receiver(post_delete, sender=User)
+def drop_author_counter(sender, instance, **kwargs):
+    counters.drop_feed_count(counters.feed_key(author=instance))
+
+
+def count_follow(follow, delta):
+    # Оба счётчика сдвигаются в одной транзакции с подпиской.
+    with transaction.atomic():
+        counters.adjust_user_counters(follow.user_id, following_count=delta)
+        counters.adjust_user_counters(follow.author_id, followers_count=delta)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        count_follow(instance, 1)
+        timeline.promote_if_celebrity(instance.author_id)
+        timeline.backfill(instance.user_id, instance.author_id)
+        feed_cache.follow_changed(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    count_follow(instance, -1)
+    timeline.prune(instance.user_id, instance.author_id)
+    feed_cache.follow_changed(instance)
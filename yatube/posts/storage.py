@@ -0,0 +1,40 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл получает имя из SHA-256 содержимого и расширения исходного имени,
+поэтому одна и та же картинка хранится один раз, сколько бы постов её ни
+показывали, и миниатюры у таких постов общие. Ссылки на файл — это
+строки ``Post`` с тем же ``image``: файл удаляется, когда пропадает
+последняя из них (см. ``images.release``).
+"""
+import hashlib
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def content_name(self, name, content):
+        """Имя файла в каталоге ``name`` из хеша содержимого."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, f'{digest.hexdigest()}{extension}')
+
+    def save(self, name, content, max_length=None):
+        """Сохраняет файл или возвращает имя уже сохранённой копии.
+
+        ``Post.save`` вызывает его под блокировкой строки
+        ``StoredImage``, поэтому файл не удалят между проверкой
+        и ссылкой на него из поста.
+        """
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
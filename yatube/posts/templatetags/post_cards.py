@@ -0,0 +1,14 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, variant):
+    """Карточки постов страницы из кэша: ``{% post_cards page_obj 'index'
+    as cards %}``.
+    """
+    return [mark_safe(card) for card in render_cards(list(posts), variant)]
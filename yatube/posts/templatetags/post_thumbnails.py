@@ -0,0 +1,13 @@
+from django import template
+
+from ..thumbnails import prepared_thumbnail as get_prepared_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def prepared_thumbnail(image, geometry):
+    """Миниатюра, если уже готова, иначе исходная картинка:
+    ``{% prepared_thumbnail post.image "960x339" as im %}``.
+    """
+    return get_prepared_thumbnail(image, geometry)
@@ -0,0 +1,125 @@
+import gzip
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(POSTS_ORDERED_BY=2)
+class FeedApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='leo', first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Коты', slug='cats', description='Про котов'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i} ' + 'текст ' * 30,
+                author=cls.author,
+                group=cls.group,
+            )
+            for i in range(3)
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def get_json(self, url, client=None, **params):
+        response = (client or self.guest_client).get(url, params)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return json.loads(response.content)
+
+    def test_feed_serializes_card_fields(self):
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(reverse('posts:api_index'))
+        self.assertEqual(response.templates, [])
+        data = json.loads(response.content)
+        self.assertEqual(data['results'][0], {
+            'id': self.posts[0].pk,
+            'text': self.posts[0].text,
+            'truncated': False,
+            'pub_date': self.posts[0].pub_date.isoformat(),
+            'author': {'username': 'leo', 'name': 'Лев Толстой'},
+            'group': 'cats',
+            'image': None,
+        })
+
+    @override_settings(POST_PREVIEW_LENGTH=10)
+    def test_long_text_is_truncated(self):
+        post = self.get_json(reverse('posts:api_index'))['results'][0]
+        self.assertTrue(post['truncated'])
+        self.assertLessEqual(len(post['text']), settings.POST_PREVIEW_LENGTH)
+
+    def test_cursor_paging(self):
+        feeds = (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_posts', args=['cats']),
+            reverse('posts:api_profile', args=['leo']),
+        )
+        for url in feeds:
+            with self.subTest(url=url):
+                first = self.get_json(url)
+                second = self.get_json(url, cursor=first['next'])
+                self.assertEqual(
+                    [post['id'] for post in first['results']
+                     + second['results']],
+                    [post.pk for post in self.posts],
+                )
+                self.assertIsNone(second['next'])
+                self.assertIsNotNone(second['previous'])
+
+    def test_follow_feed_needs_login(self):
+        url = reverse('posts:api_follow_index')
+        self.assertEqual(self.guest_client.get(url).status_code, 401)
+        client = Client()
+        client.force_login(self.reader)
+        self.assertEqual(len(self.get_json(url, client)['results']), 2)
+
+    def test_gzip(self):
+        response = self.guest_client.get(
+            reverse('posts:api_index'), HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(data['results']), 2)
+
+    def test_gzip_etag_is_weak(self):
+        url = reverse('posts:api_index')
+        self.guest_client.get(url)
+        plain = self.guest_client.get(url)
+        compressed = self.guest_client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(compressed['ETag'], f'W/{plain["ETag"]}')
+        revalidated = self.guest_client.get(
+            url, HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=compressed['ETag'],
+        )
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_conditional_get(self):
+        url = reverse('posts:api_profile', args=['leo'])
+        self.guest_client.get(url)
+        response = self.guest_client.get(url)
+        revalidated = self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(revalidated.status_code, 304)
+        Post.objects.create(text='Новый', author=self.author)
+        changed = self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(changed.status_code, 200)
@@ -0,0 +1,179 @@
+import asyncio
+import threading
+import time
+
+from django.core.wsgi import get_wsgi_application
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from core.asgi import RESPONSE_BUFFER, WSGIAdapter, build_environ
+
+
+class StreamedBody:
+    """Потоковый ответ, запоминающий потоки, в которых его читают."""
+
+    def __init__(self, threads):
+        self.threads = threads
+
+    def __iter__(self):
+        for _ in range(20):
+            self.threads.add(threading.get_ident())
+            time.sleep(0.001)
+            yield b'x'
+
+    def close(self):
+        self.threads.add(threading.get_ident())
+
+
+class ASGIAdapterTests(SimpleTestCase):
+    def setUp(self):
+        self.application = WSGIAdapter(get_wsgi_application(), 2)
+        self.addCleanup(self.application.executor.shutdown)
+
+    def scope(self, path):
+        return {
+            'type': 'http',
+            'method': 'GET',
+            'path': path,
+            'query_string': b'',
+            'headers': [(b'host', b'testserver')],
+        }
+
+    def request(self, path, **scope):
+        messages = [{'type': 'http.request', 'body': b''}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {**self.scope(path), **scope}
+        asyncio.run(self.application(scope, receive, send))
+        return sent
+
+    def test_response_is_sent_from_pool(self):
+        sent = self.request(reverse('about:author'))
+        self.assertEqual(sent[0]['type'], 'http.response.start')
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn(
+            (b'content-type', b'text/html; charset=utf-8'), sent[0]['headers']
+        )
+        body = b''.join(message['body'] for message in sent[1:])
+        self.assertIn('Об авторе'.encode(), body)
+        self.assertFalse(sent[-1].get('more_body', False))
+
+    def test_streamed_response_stays_in_one_thread(self):
+        """Куски и close() потокового ответа идут в потоке, вызвавшем
+        view, даже когда одновременных ответов больше, чем потоков.
+        """
+        threads = {}
+
+        def wsgi_application(environ, start_response):
+            path = environ['PATH_INFO']
+            threads[path] = {threading.get_ident()}
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return StreamedBody(threads[path])
+
+        application = WSGIAdapter(wsgi_application, 4)
+        self.addCleanup(application.executor.shutdown)
+
+        async def stream(path):
+            messages = [{'type': 'http.request', 'body': b''}]
+            chunks = []
+
+            async def receive():
+                return messages.pop(0)
+
+            async def send(message):
+                chunks.append(message.get('body', b''))
+                await asyncio.sleep(0)
+
+            await application(self.scope(path), receive, send)
+            return b''.join(chunks)
+
+        async def main():
+            return await asyncio.gather(
+                *(stream(f'/{i}/') for i in range(8))
+            )
+
+        bodies = asyncio.run(main())
+        self.assertEqual(bodies, [b'x' * 20] * 8)
+        for path, used in threads.items():
+            with self.subTest(path=path):
+                self.assertEqual(len(used), 1)
+
+    def test_slow_client_holds_back_response(self):
+        produced = []
+
+        def wsgi_application(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            for i in range(100):
+                produced.append(i)
+                yield b'x'
+
+        application = WSGIAdapter(wsgi_application, 1)
+        self.addCleanup(application.executor.shutdown)
+        messages = [{'type': 'http.request', 'body': b''}]
+        ahead = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            await asyncio.sleep(0.001)
+            ahead.append(len(produced) - len(ahead))
+
+        asyncio.run(application(self.scope('/'), receive, send))
+        self.assertEqual(len(produced), 100)
+        self.assertLessEqual(max(ahead), RESPONSE_BUFFER + 2)
+
+    def test_body_is_read_in_parts(self):
+        messages = [
+            {'type': 'http.request', 'body': b'a=1', 'more_body': True},
+            {'type': 'http.request', 'body': b'&b=2'},
+        ]
+
+        async def receive():
+            return messages.pop(0)
+
+        body = asyncio.run(self.application.read_body(receive))
+        self.assertEqual(body.read(), b'a=1&b=2')
+
+    def test_environ(self):
+        environ = build_environ({
+            'type': 'http',
+            'method': 'POST',
+            'path': '/группа/',
+            'query_string': b'q=1',
+            'headers': [
+                (b'content-type', b'text/plain'),
+                (b'cookie', b'a=1'),
+                (b'cookie', b'b=2'),
+            ],
+        }, None)
+        self.assertEqual(environ['PATH_INFO'], '/группа/'.encode().decode(
+            'latin1'
+        ))
+        self.assertEqual(environ['QUERY_STRING'], 'q=1')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['HTTP_COOKIE'], 'a=1; b=2')
+
+    def test_lifespan(self):
+        messages = [
+            {'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(self.application({'type': 'lifespan'}, receive, send))
+        self.assertEqual(
+            sent,
+            ['lifespan.startup.complete', 'lifespan.shutdown.complete'],
+        )
@@ -0,0 +1,270 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..bulk import BulkImporter, BulkImportError, upload_opener
+from ..counters import get_feed_count, get_user_counters
+from ..models import (Comment, Follow, Group, Post, StoredImage,
+                      TimelineEntry)
+from ..search import search_paginator
+from .test_images import jpeg
+from .test_thumbnails import SMALL_GIF, TemporaryMediaMixin
+
+User = get_user_model()
+
+
+SMALL_GIF_NAME = f'posts/{hashlib.sha256(SMALL_GIF).hexdigest()}.gif'
+
+
+def post_record(**fields):
+    return {'type': 'post', 'author': 'leo', 'text': 'Пост', **fields}
+
+
+class BulkImportTests(TemporaryMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='leo')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Коты', slug='cats', description='Про котов'
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_records_are_imported_in_chunks(self):
+        records = [
+            {'type': 'follow', 'user': 'reader', 'author': 'leo'},
+            post_record(ref='p1', text='Кошки спят', group='cats',
+                        pub_date='2020-01-01T10:00:00Z'),
+            post_record(ref='p2', text='Второй пост'),
+            {'type': 'comment', 'post_ref': 'p1', 'author': 'reader',
+             'text': 'Согласен'},
+            {'type': 'comment', 'post_ref': 'p2', 'author': 'leo',
+             'text': 'Ответ', 'created': '2020-01-02T10:00:00Z'},
+        ]
+        stats = BulkImporter(chunk_size=2).run(records)
+
+        self.assertEqual(
+            (stats.posts, stats.comments, stats.follows), (2, 2, 1)
+        )
+        first = Post.objects.get(text='Кошки спят')
+        self.assertEqual(first.group, self.group)
+        self.assertEqual(
+            first.pub_date, datetime(2020, 1, 1, 10, tzinfo=timezone.utc)
+        )
+        self.assertEqual(first.comments.get().text, 'Согласен')
+        self.assertEqual(
+            Comment.objects.get(text='Ответ').created,
+            datetime(2020, 1, 2, 10, tzinfo=timezone.utc),
+        )
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+            .exists()
+        )
+
+    def test_derived_data_is_updated(self):
+        """Счётчики, ленты подписок и поиск видят загруженные записи."""
+        self.assertEqual(get_feed_count(group=self.group), 0)
+        self.assertEqual(get_user_counters(self.author).posts_count, 0)
+        BulkImporter().run([
+            {'type': 'follow', 'user': 'reader', 'author': 'leo'},
+            post_record(text='Кошки спят', group='cats'),
+            post_record(text='Собаки лают'),
+        ])
+        self.assertEqual(get_feed_count(), 2)
+        self.assertEqual(get_feed_count(group=self.group), 1)
+        self.author.refresh_from_db()
+        counters = get_user_counters(self.author)
+        self.assertEqual(counters.posts_count, 2)
+        self.assertEqual(counters.followers_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        page = search_paginator('кошка', 10).get_cursor_page(None)
+        self.assertEqual([post.text for post in page], ['Кошки спят'])
+
+    def test_cached_pages_are_refreshed(self):
+        client = Client()
+        client.get(reverse('posts:index'))
+        BulkImporter().run([post_record(text='Новый пост')])
+        self.assertContains(client.get(reverse('posts:index')), 'Новый пост')
+
+    def test_invalid_record_rolls_back_its_chunk(self):
+        records = [
+            post_record(text='Первая пачка'),
+            post_record(text='Вторая пачка'),
+            post_record(author='nobody'),
+        ]
+        importer = BulkImporter(chunk_size=1)
+        with self.assertRaisesMessage(BulkImportError, 'Запись 3'):
+            importer.run(records)
+        self.assertEqual(importer.stats.posts, 2)
+        self.assertEqual(Post.objects.count(), 2)
+
+        for record in (
+            {'type': 'like'},
+            post_record(group='unknown'),
+            post_record(pub_date='вчера'),
+            {'type': 'comment', 'post_ref': 'p9', 'author': 'leo',
+             'text': 'Ответ'},
+            {'type': 'follow', 'user': 'leo', 'author': 'leo'},
+            post_record(author=['leo']),
+            post_record(group=['cats']),
+            post_record(text=5),
+            {'type': 'comment', 'post': True, 'author': 'leo',
+             'text': 'Ответ'},
+        ):
+            with self.subTest(record=record):
+                with self.assertRaises(BulkImportError):
+                    BulkImporter().run([record])
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_rolled_back_chunk_releases_its_images(self):
+        images = {'picture': SimpleUploadedFile('small.gif', SMALL_GIF)}
+        importer = BulkImporter(open_image=lambda name: images[name])
+        with mock.patch('django.db.transaction.on_commit',
+                        side_effect=lambda func: func()):
+            with self.assertRaisesMessage(BulkImportError, 'Запись 2'):
+                importer.run([
+                    post_record(image='picture'),
+                    post_record(image='missing'),
+                ])
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(default_storage.exists(SMALL_GIF_NAME))
+
+    def test_ids_are_not_guessed_on_other_databases(self):
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            with self.assertRaises(ImproperlyConfigured):
+                BulkImporter().run([post_record()])
+        self.assertFalse(Post.objects.exists())
+
+    def test_endpoint_is_for_staff(self):
+        url = reverse('posts:bulk_import')
+        client = Client()
+        client.force_login(self.reader)
+        response = client.post(
+            url, json.dumps([post_record()]), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+        staff = User.objects.create_user(username='admin', is_staff=True)
+        client.force_login(staff)
+        response = client.post(
+            url, json.dumps([post_record(text='Через API')]),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['posts'], 1)
+        self.assertTrue(Post.objects.filter(text='Через API').exists())
+
+        response = client.post(
+            url, json.dumps([post_record(author='nobody')]),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Запись 1', response.json()['error'])
+
+    def test_endpoint_accepts_images(self):
+        client = Client()
+        client.force_login(
+            User.objects.create_user(username='admin', is_staff=True)
+        )
+        response = client.post(reverse('posts:bulk_import'), {
+            'records': json.dumps([post_record(image='picture')]),
+            'picture': SimpleUploadedFile('small.gif', SMALL_GIF),
+        })
+        self.assertEqual(response.json()['images'], 1)
+        self.assertEqual(Post.objects.get().image.name, SMALL_GIF_NAME)
+
+    def test_records_share_one_uploaded_image(self):
+        client = Client()
+        client.force_login(
+            User.objects.create_user(username='admin', is_staff=True)
+        )
+        response = client.post(reverse('posts:bulk_import'), {
+            'records': json.dumps([
+                post_record(text='Первый', image='picture'),
+                post_record(text='Второй', image='picture'),
+            ]),
+            'picture': SimpleUploadedFile('small.gif', SMALL_GIF),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(Post.objects.values_list('image', flat=True)),
+            [SMALL_GIF_NAME, SMALL_GIF_NAME],
+        )
+
+    @override_settings(IMAGE_MAX_SIDE=10)
+    def test_images_are_checked_and_processed(self):
+        images = {
+            'photo': SimpleUploadedFile('photo', jpeg(orientation=6)),
+            'text': SimpleUploadedFile('text.jpg', b'not an image'),
+        }
+        importer = BulkImporter(open_image=upload_opener(images))
+        importer.run([post_record(image='photo')])
+        post = Post.objects.get()
+        self.assertRegex(post.image.name, r'^posts/[0-9a-f]{64}\.jpg$')
+        with default_storage.open(post.image.name) as file, \
+                Image.open(file) as image:
+            self.assertEqual(image.size, (5, 10))
+            self.assertEqual(len(image.getexif()), 0)
+        self.assertTrue(
+            StoredImage.objects.get(name=post.image.name).processed
+        )
+
+        with self.assertRaisesMessage(BulkImportError, 'Запись 2'):
+            BulkImporter(open_image=upload_opener(images)).run([
+                post_record(), post_record(image='text'),
+            ])
+        with override_settings(IMAGE_MAX_PIXELS=100), \
+                self.assertRaisesMessage(
+                    BulkImportError, 'Картинка слишком большая'):
+            BulkImporter(open_image=upload_opener(images)).run(
+                [post_record(image='photo')]
+            )
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_command_reads_ndjson(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with open(os.path.join(directory, 'small.gif'), 'wb') as image:
+            image.write(SMALL_GIF)
+        path = os.path.join(directory, 'records.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            for record in (
+                post_record(ref='p1', image='small.gif'),
+                {'type': 'comment', 'post_ref': 'p1', 'author': 'reader',
+                 'text': 'Согласен'},
+            ):
+                file.write(json.dumps(record) + '\n')
+        out = StringIO()
+        call_command('import_content', path, images=directory, stdout=out)
+        self.assertIn('постов: 1, комментариев: 1', out.getvalue())
+        self.assertEqual(Post.objects.get().image.name, SMALL_GIF_NAME)
+
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps(post_record(image='../records.ndjson')))
+        with self.assertRaises(CommandError):
+            call_command(
+                'import_content', path,
+                images=os.path.join(directory, 'images'), stdout=out,
+            )
@@ -0,0 +1,259 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+from core.cache import SQLiteCache
+from core.singleflight import LOCK_KEY, get_or_set
+
+from ..cards import render_cards
+from ..etags import known_id
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedFragmentCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for i in range(12):
+            Post.objects.create(
+                text=f'Пост номер {i}', author=cls.author, group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(FeedFragmentCacheTests.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(FeedFragmentCacheTests.reader)
+
+    def test_pages_do_not_share_fragment(self):
+        """Вторая страница ленты не берёт фрагмент первой."""
+        first = self.guest_client.get(reverse('posts:index'))
+        second = self.guest_client.get(
+            reverse('posts:index') + '?cursor='
+            + first.context['page_obj'].next_cursor
+        )
+        self.assertContains(first, 'Пост номер 0')
+        self.assertNotContains(second, 'Пост номер 0')
+        self.assertContains(second, 'Пост номер 11')
+
+    def test_follow_feed_is_per_viewer(self):
+        """Лента подписок одного пользователя не видна другому."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        reader_feed = self.reader_client.get(reverse('posts:follow_index'))
+        author_feed = self.author_client.get(reverse('posts:follow_index'))
+        self.assertContains(reader_feed, 'Пост номер 0')
+        self.assertNotContains(author_feed, 'Пост номер 0')
+
+    def test_post_edit_invalidates_fragment(self):
+        """Правка поста видна сразу, без ожидания срока жизни кэша."""
+        self.guest_client.get(reverse('posts:index'))
+        post = Post.objects.order_by('pk').first()
+        post.text = 'Исправленный текст'
+        post.save()
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Исправленный текст')
+
+    def test_group_change_invalidates_fragment(self):
+        self.guest_client.get(
+            reverse('posts:profile', args=[self.author.username])
+        )
+        self.group.slug = 'new-slug'
+        self.group.save()
+        response = self.guest_client.get(
+            reverse('posts:profile', args=[self.author.username])
+        )
+        self.assertContains(response, '/group/new-slug/')
+
+    def test_author_rename_invalidates_cards(self):
+        """Новое имя автора видно в закэшированных лентах и картах."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=[self.group.slug]),
+        ]
+        for url in urls:
+            self.guest_client.get(url)
+        self.author.first_name = 'Лев'
+        self.author.last_name = 'Толстой'
+        self.author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.guest_client.get(url), 'Автор: Лев Толстой'
+                )
+
+    def test_username_change_forgets_both_names(self):
+        self.guest_client.get(
+            reverse('posts:profile', args=[self.author.username])
+        )
+        self.assertEqual(known_id('user', 'auth'), self.author.pk)
+        self.author.username = 'leo'
+        self.author.save()
+        self.assertIsNone(known_id('user', 'auth'))
+        self.assertIsNone(known_id('user', 'leo'))
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='Карточка', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(PostCardCacheTests.author)
+
+    def test_cards_are_rendered_once(self):
+        """Повторная страница собирается из кэша карточек."""
+        posts = list(Post.objects.all())
+        first = render_cards(posts, 'index')
+        with mock.patch('posts.cards.render_to_string') as render:
+            second = render_cards(posts, 'index')
+        render.assert_not_called()
+        self.assertEqual(first, second)
+
+    def test_card_survives_post_edit(self):
+        """После правки через post_edit карточка рисуется заново."""
+        render_cards([self.post], 'profile')
+        self.author_client.post(
+            reverse('posts:post_edit', args=[self.post.pk]),
+            data={'text': 'Новый текст карточки'},
+        )
+        post = Post.objects.get(pk=self.post.pk)
+        [card] = render_cards([post], 'profile')
+        self.assertIn('Новый текст карточки', card)
+
+
+class SharedCacheBackendTests(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        self.location = os.path.join(tmp_dir, 'cache.sqlite3')
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_entries_are_shared(self):
+        """Запись видна другому экземпляру с тем же файлом — как другому
+        воркеру.
+        """
+        self.make_cache().set('key', {'value': 1})
+        other = self.make_cache()
+        self.assertEqual(other.get('key'), {'value': 1})
+        other.add('counter', 1)
+        self.assertEqual(self.make_cache().incr('counter'), 2)
+
+    def test_least_recently_used_are_culled(self):
+        backend = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        for number, key in enumerate(['a', 'b', 'c']):
+            backend.set(key, number)
+        with mock.patch('core.cache.time.time',
+                        return_value=time.time() + 60):
+            backend.get('a')
+            backend.set('d', 3)
+        self.assertEqual(
+            backend.get_many(['a', 'b', 'c', 'd']),
+            {'a': 0, 'c': 2, 'd': 3},
+        )
+
+    def test_size_limit(self):
+        backend = self.make_cache(MAX_SIZE=1000, CULL_FREQUENCY=2)
+        for number in range(10):
+            backend.set(f'key{number}', 'x' * 200)
+        self.assertLess(len(backend.get_many(
+            [f'key{number}' for number in range(10)]
+        )), 10)
+        self.assertTrue(backend.has_key('key9'))
+
+    def test_hits_and_misses_are_counted(self):
+        backend = self.make_cache()
+        backend.set('key', 1)
+        before = metrics.snapshot()
+        backend.get('key')
+        backend.get_many(['key', 'missing'])
+        after = metrics.snapshot()
+        self.assertEqual(
+            after['cache_hits_total'] - before.get('cache_hits_total', 0), 2
+        )
+        self.assertEqual(
+            after['cache_misses_total']
+            - before.get('cache_misses_total', 0),
+            1,
+        )
+
+    def test_tests_do_not_share_server_files(self):
+        for path in (settings.CACHES['default']['LOCATION'],
+                     settings.THUMBNAIL_KVSTORE_PATH, settings.MEDIA_ROOT):
+            with self.subTest(path=path):
+                self.assertFalse(path.startswith(settings.BASE_DIR))
+
+    def test_clear_caches_command(self):
+        cache.set('key', 1)
+        call_command('clear_caches', stdout=open(os.devnull, 'w'))
+        self.assertIsNone(cache.get('key'))
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def fill(self):
+        self.calls += 1
+        time.sleep(0.1)
+        return 'значение'
+
+    def test_threads_share_one_fill(self):
+        """Потоки одного процесса ждут значение первого."""
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(get_or_set('key', self.fill))
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['значение'] * 5)
+        self.assertEqual(cache.get('key'), 'значение')
+
+    def test_waits_for_other_process(self):
+        """Пока ключ держит другой процесс, значение ждут из кэша."""
+        cache.add(LOCK_KEY.format('key'), 1)
+        timer = threading.Timer(0.1, cache.set, ['key', 'из кэша'])
+        timer.start()
+        self.assertEqual(get_or_set('key', self.fill), 'из кэша')
+        timer.join()
+        self.assertEqual(self.calls, 0)
+
+    @override_settings(SINGLE_FLIGHT_WAIT=0.2)
+    def test_fills_itself_when_other_process_hangs(self):
+        cache.add(LOCK_KEY.format('key'), 1)
+        self.assertEqual(get_or_set('key', self.fill), 'значение')
+        self.assertEqual(self.calls, 1)
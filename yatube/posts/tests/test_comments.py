@@ -0,0 +1,97 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.generations import get_generations
+
+from ..feed_cache import post_scope
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(COMMENTS_PER_PAGE=2)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(CommentPaginationTests.author)
+        self.url = reverse('posts:post_detail', args=[self.post.pk])
+
+    def add_comments(self, count):
+        for i in range(count):
+            Comment.objects.create(
+                post=self.post, author=self.author, text=f'Комментарий {i}'
+            )
+
+    def test_comments_are_paginated(self):
+        """Страница поста показывает первые комментарии, остальные
+        подгружаются фрагментами.
+        """
+        self.add_comments(5)
+        response = self.client.get(self.url)
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Комментарий 0', 'Комментарий 1'],
+        )
+        cursor = response.context['comments_cursor']
+        texts = []
+        while cursor:
+            data = self.client.get(
+                reverse('posts:post_comments', args=[self.post.pk]),
+                {'cursor': cursor},
+            ).json()
+            texts.append(data['html'])
+            cursor = data['cursor']
+        self.assertEqual(len(texts), 2)
+        self.assertIn('Комментарий 3', texts[0])
+        self.assertIn('Комментарий 4', texts[1])
+
+    def test_first_page_is_cached(self):
+        self.add_comments(1)
+        self.client.get(self.url)
+        with self.assertNumQueries(3):
+            # Сессия, пользователь и пост; комментарии берутся из кэша.
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Комментарий 0')
+
+    def test_add_comment_resets_first_page(self):
+        self.add_comments(1)
+        self.client.get(self.url)
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            data={'text': 'Свежий комментарий'},
+        )
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Свежий комментарий')
+
+    def test_commenter_change_resets_post_page(self):
+        """Новое имя комментатора видно на закэшированной странице поста
+        и в кэше первых комментариев; отключение тоже сбрасывает их.
+        """
+        commenter = User.objects.create_user(username='reader')
+        Comment.objects.create(
+            post=self.post, author=commenter, text='Комментарий'
+        )
+        guest = Client()
+        for client in (guest, self.client):
+            client.get(self.url)
+        commenter.username = 'new-reader'
+        commenter.save()
+        for client in (guest, self.client):
+            with self.subTest(authenticated=client is self.client):
+                response = client.get(self.url)
+                self.assertContains(response, '/profile/new-reader/')
+                self.assertNotContains(response, '/profile/reader/')
+        scope = post_scope(self.post.pk)
+        generation = get_generations([scope])[scope]
+        commenter.is_active = False
+        commenter.save(update_fields=['is_active'])
+        self.assertNotEqual(get_generations([scope])[scope], generation)
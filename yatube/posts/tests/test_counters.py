@@ -0,0 +1,185 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import counters
+from ..models import FeedCounter, Follow, Group, Post, UserCounters
+from ..paginator import CursorPaginator
+
+User = get_user_model()
+
+
+class FeedCounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.group_two = Group.objects.create(
+            title='Тестовая группа 2',
+            slug='test-slug2',
+            description='Тестовое описание 2',
+        )
+        for _ in range(3):
+            Post.objects.create(
+                text='Тестовый текст', author=cls.author, group=cls.group
+            )
+
+    def test_counter_is_created_lazily(self):
+        """Счётчик заводится при первом обращении точным подсчётом."""
+        self.assertFalse(FeedCounter.objects.exists())
+        self.assertEqual(counters.get_feed_count(group=self.group), 3)
+        self.assertTrue(
+            FeedCounter.objects.filter(key=f'group:{self.group.pk}').exists()
+        )
+
+    def test_counters_follow_post_changes(self):
+        """Создание, перенос в другую группу и удаление поста."""
+        counters.get_feed_count()
+        counters.get_feed_count(group=self.group)
+        counters.get_feed_count(group=self.group_two)
+        counters.get_feed_count(author=self.author)
+        post = Post.objects.create(
+            text='Новый пост', author=self.author, group=self.group
+        )
+        self.assertEqual(counters.get_feed_count(), 4)
+        self.assertEqual(counters.get_feed_count(group=self.group), 4)
+        self.assertEqual(counters.get_feed_count(author=self.author), 4)
+
+        post.group = self.group_two
+        post.save()
+        self.assertEqual(counters.get_feed_count(group=self.group), 3)
+        self.assertEqual(counters.get_feed_count(group=self.group_two), 1)
+
+        post.delete()
+        self.assertEqual(counters.get_feed_count(), 3)
+        self.assertEqual(counters.get_feed_count(group=self.group_two), 0)
+        self.assertEqual(counters.get_feed_count(author=self.author), 3)
+
+    @override_settings(FEED_COUNT_ESTIMATE_THRESHOLD=1)
+    def test_global_count_uses_planner_estimate(self):
+        """На большой таблице общая лента считается по статистике."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Статистика проверяется на SQLite')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(counters.estimate_table_rows(Post), 3)
+        self.assertEqual(counters.get_feed_count(), 3)
+
+
+class UserCountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.author
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(UserCountersTests.reader)
+
+    def counters(self, user):
+        return counters.get_user_counters(User.objects.get(pk=user.pk))
+
+    def test_counters_follow_changes(self):
+        """Подписка, комментарий и новый пост сдвигают счётчики."""
+        self.counters(self.author)
+        self.counters(self.reader)
+        self.client.get(reverse('posts:profile_follow', args=[self.author]))
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            data={'text': 'Комментарий'},
+        )
+        Post.objects.create(text='Второй пост', author=self.author)
+        author = self.counters(self.author)
+        reader = self.counters(self.reader)
+        self.assertEqual(
+            (author.posts_count, author.followers_count), (2, 1)
+        )
+        self.assertEqual(
+            (reader.following_count, reader.comments_count), (1, 1)
+        )
+        Follow.objects.all().delete()
+        Post.objects.get(pk=self.post.pk).delete()
+        author = self.counters(self.author)
+        reader = self.counters(self.reader)
+        self.assertEqual(
+            (author.posts_count, author.followers_count), (1, 0)
+        )
+        self.assertEqual(
+            (reader.following_count, reader.comments_count), (0, 0)
+        )
+
+    def test_failed_write_leaves_counters_alone(self):
+        """Ошибка после записи откатывает её вместе со счётчиками."""
+        self.counters(self.author)
+        self.counters(self.reader)
+        with mock.patch('posts.signals.timeline.fan_out_post',
+                        side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            self.client.post(
+                reverse('posts:post_create'), data={'text': 'Новый пост'}
+            )
+        self.assertFalse(Post.objects.filter(text='Новый пост').exists())
+        self.assertEqual(self.counters(self.reader).posts_count, 0)
+
+    def test_views_do_not_count(self):
+        """Профиль и страница поста не выполняют COUNT(*)."""
+        self.counters(self.author)
+        for url in (reverse('posts:profile', args=[self.author]),
+                    reverse('posts:post_detail', args=[self.post.pk])):
+            with self.subTest(url=url), \
+                    CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            self.assertFalse(
+                [query for query in queries.captured_queries
+                 if 'COUNT(' in query['sql']]
+            )
+
+    def test_rebuild_fixes_drift(self):
+        UserCounters.objects.create(user=self.author, posts_count=10)
+        out = StringIO()
+        call_command('rebuild_counters', stdout=out)
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.counters(self.reader).posts_count, 0)
+        self.assertIn('Исправлено счётчиков пользователей: 2', out.getvalue())
+
+
+class PageWindowTests(TestCase):
+    def window(self, number, count):
+        paginator = CursorPaginator(
+            Post.objects.none(), 10, count=count
+        )
+        page = paginator.build_page([], number, False, number > 1)
+        return page.page_window
+
+    def test_short_feed_shows_all_pages(self):
+        self.assertEqual(self.window(1, 35), [1, 2, 3, 4])
+
+    def test_long_feed_is_elided(self):
+        """Окно не растёт вместе с лентой."""
+        self.assertEqual(
+            self.window(50, 100_000),
+            [1, None, 48, 49, 50, 51, 52, None, 10000]
+        )
+        self.assertEqual(self.window(1, 100_000), [1, 2, 3, None, 10000])
+
+    def test_unknown_count_has_no_window(self):
+        paginator = CursorPaginator(Post.objects.none(), 10)
+        page = paginator.build_page([], 1, False, False)
+        self.assertEqual(page.page_window, [])
@@ -0,0 +1,116 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='test-slug', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.urls = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_posts', args=[self.group.slug]),
+            'profile': reverse('posts:profile', args=[self.author.username]),
+            'post': reverse('posts:post_detail', args=[self.post.pk]),
+        }
+
+    def get(self, url, client=None):
+        """Страница после первого показа, когда id объекта уже известен.
+        """
+        client = client or self.guest_client
+        client.get(url)
+        return client.get(url)
+
+    def revalidate(self, url, response, client=None):
+        client = client or self.guest_client
+        return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_return_304(self):
+        """Неизменившаяся страница отвечает 304 без запроса ленты."""
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                response = self.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('ETag', response)
+                with self.assertNumQueries(0):
+                    revalidated = self.revalidate(url, response)
+                self.assertEqual(revalidated.status_code, 304)
+
+    def test_new_post_changes_feeds(self):
+        responses = {
+            name: self.get(url)
+            for name, url in self.urls.items()
+        }
+        Post.objects.create(text='Новый', author=self.author, group=self.group)
+        for name in ('index', 'group', 'profile', 'post'):
+            with self.subTest(page=name):
+                response = self.revalidate(self.urls[name], responses[name])
+                self.assertEqual(response.status_code, 200)
+
+    def test_edit_and_comment_change_post_page(self):
+        url = self.urls['post']
+        response = self.get(url)
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        edited = self.revalidate(url, response)
+        self.assertEqual(edited.status_code, 200)
+        self.assertContains(edited, 'Исправленный пост')
+
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        commented = self.revalidate(url, edited)
+        self.assertEqual(commented.status_code, 200)
+        self.assertContains(commented, 'Комментарий')
+
+    def test_follow_changes_profile(self):
+        url = self.urls['profile']
+        response = self.get(url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        """Гость не получает 304 на ETag страницы пользователя."""
+        client = Client()
+        client.force_login(self.reader)
+        response = self.get(self.urls['index'], client)
+        self.assertEqual(
+            self.revalidate(self.urls['index'], response, client).status_code,
+            304,
+        )
+        self.assertEqual(
+            self.revalidate(self.urls['index'], response).status_code, 200
+        )
+
+    def test_new_login_changes_etag(self):
+        """После нового входа страница с формой приходит с новым
+        CSRF-токеном, а не 304.
+        """
+        User.objects.create_user(username='leo', password='пароль-123')
+        client = Client()
+        credentials = {'username': 'leo', 'password': 'пароль-123'}
+        client.post(reverse('users:login'), credentials)
+        url = self.urls['post']
+        response = self.get(url, client)
+        self.assertEqual(self.revalidate(url, response, client).status_code,
+                         304)
+        client.post(reverse('users:login'), credentials)
+        self.assertEqual(self.revalidate(url, response, client).status_code,
+                         200)
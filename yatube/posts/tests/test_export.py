@@ -0,0 +1,129 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..bulk import BulkImporter
+from ..export import export_stream
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def read(chunks):
+    return b''.join(chunks).decode()
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2, EXPORT_BLOCK_LINES=2)
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='leo')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Коты', slug='cats', description='Про котов'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group
+            )
+            for i in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Согласен'
+        )
+
+    def test_ndjson_has_all_tables_in_import_order(self):
+        records = [
+            json.loads(line)
+            for line in read(export_stream(['follows', 'posts', 'comments']))
+            .splitlines()
+        ]
+        self.assertEqual(
+            [record['type'] for record in records],
+            ['follow'] + ['post'] * 5 + ['comment'],
+        )
+        post = records[1]
+        self.assertEqual(post['text'], 'Пост 0')
+        self.assertEqual(post['author'], 'leo')
+        self.assertEqual(post['group'], 'cats')
+        self.assertEqual(post['pub_date'], self.posts[0].pub_date.isoformat())
+        self.assertIsNone(post['image'])
+        self.assertEqual(records[-1]['post_ref'], post['ref'])
+
+    def test_export_can_be_imported(self):
+        records = [
+            json.loads(line)
+            for line in read(export_stream(['posts', 'comments']))
+            .splitlines()
+        ]
+        Post.objects.all().delete()
+        stats = BulkImporter().run(records)
+        self.assertEqual((stats.posts, stats.comments), (5, 1))
+        self.assertEqual(
+            Comment.objects.get().post.text, 'Пост 0'
+        )
+
+    def test_csv_exports_one_table(self):
+        rows = list(csv.DictReader(
+            read(export_stream(['posts'], 'csv')).splitlines()
+        ))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['text'], 'Пост 0')
+        with self.assertRaises(ValueError):
+            export_stream(['posts', 'comments'], 'csv')
+
+    def test_gzip(self):
+        self.assertEqual(
+            gzip.decompress(b''.join(export_stream(['posts'], compress=True))),
+            b''.join(export_stream(['posts'])),
+        )
+
+    def test_view_streams_for_staff(self):
+        url = reverse('posts:export')
+        client = Client()
+        client.force_login(self.reader)
+        self.assertEqual(client.get(url).status_code, 403)
+
+        client.force_login(
+            User.objects.create_user(username='admin', is_staff=True)
+        )
+        response = client.get(url, {'models': 'posts', 'gzip': '1'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('posts.ndjson.gz', response['Content-Disposition'])
+        lines = gzip.decompress(
+            b''.join(response.streaming_content)
+        ).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+
+        for params in (
+            {'format': 'xml'},
+            {'models': 'users'},
+            {'format': 'csv', 'models': 'posts,comments'},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(client.get(url, params).status_code, 400)
+
+    def test_command_writes_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'comments.csv')
+        call_command(
+            'export_content', export_format='csv', models='comments',
+            output=path,
+        )
+        with open(path, encoding='utf-8') as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(rows[0]['text'], 'Согласен')
+        with self.assertRaises(CommandError):
+            call_command('export_content', models='users', output=path)
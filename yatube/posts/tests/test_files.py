@@ -0,0 +1,103 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+
+from .test_thumbnails import TemporaryMediaMixin
+
+CSS = b'body { color: black; }\n' * 100
+
+
+class FileServingTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        with open(os.path.join(self.media_root, 'a.txt'), 'wb') as file:
+            file.write(b'0123456789')
+        self.client = Client()
+
+    def test_whole_file(self):
+        response = self.client.get('/media/a.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('max-age=', response['Cache-Control'])
+        self.assertEqual(
+            self.client.get(
+                '/media/a.txt', HTTP_IF_NONE_MATCH=response['ETag']
+            ).status_code,
+            304,
+        )
+
+    def test_ranges(self):
+        for header, status, body, content_range in (
+            ('bytes=2-5', 206, b'2345', 'bytes 2-5/10'),
+            ('bytes=7-', 206, b'789', 'bytes 7-9/10'),
+            ('bytes=-3', 206, b'789', 'bytes 7-9/10'),
+            ('bytes=8-100', 206, b'89', 'bytes 8-9/10'),
+            ('bytes=0-1,4-5', 200, b'0123456789', None),
+            ('bytes=20-', 416, b'', 'bytes */10'),
+        ):
+            with self.subTest(header=header):
+                response = self.client.get('/media/a.txt', HTTP_RANGE=header)
+                self.assertEqual(response.status_code, status)
+                content = (
+                    b''.join(response.streaming_content)
+                    if response.streaming else response.content
+                )
+                self.assertEqual(content, body)
+                self.assertEqual(response.get('Content-Range'), content_range)
+
+    def test_stale_if_range_gets_whole_file(self):
+        response = self.client.get(
+            '/media/a.txt', HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"old"'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_precompressed_copy(self):
+        with open(os.path.join(self.media_root, 'site.css'), 'wb') as file:
+            file.write(CSS)
+        with open(os.path.join(self.media_root, 'site.css.gz'), 'wb') as file:
+            file.write(gzip.compress(CSS))
+        response = self.client.get(
+            '/media/site.css', HTTP_ACCEPT_ENCODING='br;q=0, gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)), CSS
+        )
+        plain = self.client.get('/media/site.css')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertNotEqual(plain['ETag'], response['ETag'])
+
+    def test_collectstatic_hashes_and_compresses(self):
+        source = os.path.join(self.media_root, 'source')
+        os.mkdir(source)
+        with open(os.path.join(source, 'site.css'), 'wb') as file:
+            file.write(CSS)
+        static_root = os.path.join(self.media_root, 'static')
+        with override_settings(
+            STATIC_ROOT=static_root,
+            STATICFILES_DIRS=[source],
+            STATICFILES_FINDERS=[
+                'django.contrib.staticfiles.finders.FileSystemFinder',
+            ],
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            hashed = staticfiles_storage.stored_name('site.css')
+            self.assertNotEqual(hashed, 'site.css')
+            self.assertTrue(
+                os.path.exists(os.path.join(static_root, hashed + '.gz'))
+            )
+            response = self.client.get(
+                f'/static/{hashed}', HTTP_ACCEPT_ENCODING='gzip'
+            )
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn('immutable', response['Cache-Control'])
+            unhashed = self.client.get('/static/site.css')
+            self.assertNotIn('immutable', unhashed['Cache-Control'])
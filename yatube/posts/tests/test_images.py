@@ -0,0 +1,216 @@
+import hashlib
+import os
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..images import prepare_image, process_image
+from ..models import Post, StoredImage
+from ..thumbnails import generate_thumbnails, prepared_thumbnail
+from .test_thumbnails import (SMALL_GIF, TemporaryKVStoreMixin,
+                              TemporaryMediaMixin)
+
+User = get_user_model()
+
+ORIENTATION = 0x0112
+
+
+def jpeg(size=(40, 20), orientation=None):
+    image = Image.new('RGB', size, 'red')
+    exif = Image.Exif()
+    exif[0x010F] = 'Телефон'
+    if orientation:
+        exif[ORIENTATION] = orientation
+    content = BytesIO()
+    image.save(content, 'JPEG', exif=exif.tobytes())
+    return content.getvalue()
+
+
+def mpo(size=(40, 20)):
+    """JPEG с двумя кадрами, как у многих снимков с телефонов."""
+    content = BytesIO()
+    Image.new('RGB', size, 'red').save(
+        content, 'MPO', save_all=True,
+        append_images=[Image.new('RGB', size, 'blue')],
+    )
+    return content.getvalue()
+
+
+@override_settings(IMAGE_MAX_SIDE=10)
+class ImageUploadTests(TemporaryMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(ImageUploadTests.author)
+
+    def create_post(self, text, content):
+        return self.author_client.post(reverse('posts:post_create'), {
+            'text': text,
+            'image': SimpleUploadedFile(
+                'photo.JPG', content, content_type='image/jpeg'
+            ),
+        })
+
+    def test_same_image_is_stored_once(self):
+        """Одинаковые картинки хранятся в одном файле с именем из хеша."""
+        with mock.patch('posts.images.pool.submit') as submit, \
+                mock.patch('posts.thumbnails.pool.submit') as thumbnails, \
+                mock.patch('django.db.transaction.on_commit',
+                           side_effect=lambda func: func()):
+            self.create_post('Первый', jpeg())
+            self.create_post('Второй', jpeg())
+        first, second = Post.objects.order_by('pk')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^posts/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(
+            default_storage.listdir('posts')[1],
+            [os.path.basename(first.image.name)],
+        )
+        # Файл ещё не обработан: повтор ставится в ту же очередь, где
+        # пул не возьмёт одну картинку дважды.
+        submit.assert_called_with(first.image.name)
+        thumbnails.assert_not_called()
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_are_rejected(self):
+        response = self.create_post('Большой', jpeg())
+        self.assertFormError(
+            response, 'form', 'image',
+            'Картинка слишком большая: 40×20 точек',
+        )
+        self.assertFalse(Post.objects.exists())
+
+    def test_processing_shrinks_and_strips_metadata(self):
+        name = default_storage.save(
+            'posts/photo.jpg', BytesIO(jpeg(orientation=6))
+        )
+        with Image.open(process_image(name)) as image:
+            # Поворот на 90° применён к точкам до удаления EXIF.
+            self.assertEqual(image.size, (5, 10))
+            self.assertEqual(len(image.getexif()), 0)
+            self.assertEqual(image.format, 'JPEG')
+
+    def test_multi_picture_jpeg_is_processed_as_jpeg(self):
+        with mock.patch('posts.images.pool.submit') as submit, \
+                mock.patch('django.db.transaction.on_commit',
+                           side_effect=lambda func: func()):
+            self.create_post('Снимок', mpo())
+        name = Post.objects.get().image.name
+        self.assertTrue(name.endswith('.jpg'))
+        submit.assert_called_once_with(name)
+        with Image.open(process_image(name)) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (10, 5))
+            # Первый кадр — красный.
+            self.assertGreater(image.getpixel((0, 0))[0], 200)
+
+    def test_posts_move_to_processed_image(self):
+        with mock.patch('django.db.transaction.on_commit',
+                        side_effect=lambda func: func()), \
+                mock.patch('posts.images.pool.submit') as submit, \
+                mock.patch('posts.thumbnails.pool.submit') as thumbnails, \
+                mock.patch('posts.images.generate_thumbnails') as generate:
+            self.create_post('Пост', jpeg())
+            post = Post.objects.get()
+            original = post.image.name
+            prepare_image(original)
+            post.refresh_from_db()
+            with default_storage.open(post.image.name) as file:
+                content = file.read()
+            # Обработанная картинка — новый файл с хешем своего содержимого.
+            self.assertEqual(
+                post.image.name,
+                f'posts/{hashlib.sha256(content).hexdigest()}.jpg',
+            )
+            self.assertFalse(default_storage.exists(original))
+            generate.assert_called_once_with(post.image.name)
+
+            # Обработанную картинку загрузили снова: файл тот же,
+            # повторно она не пережимается.
+            self.create_post('Снова', content)
+        submit.assert_called_once_with(original)
+        thumbnails.assert_called_once_with(post.image.name)
+        self.assertEqual(
+            set(Post.objects.values_list('image', flat=True)),
+            {post.image.name},
+        )
+        self.assertEqual(len(default_storage.listdir('posts')[1]), 1)
+
+
+class SharedImageTests(TemporaryMediaMixin, TemporaryKVStoreMixin,
+                       TestCase):
+    def setUp(self):
+        super().setUp()
+        # Файлы удаляются после фиксации транзакции.
+        on_commit = mock.patch(
+            'django.db.transaction.on_commit', side_effect=lambda func: func()
+        )
+        on_commit.start()
+        self.addCleanup(on_commit.stop)
+
+    def create_post(self, author, content=SMALL_GIF):
+        return Post.objects.create(
+            text='Пост', author=author,
+            image=SimpleUploadedFile('small.gif', content),
+        )
+
+    def test_file_is_deleted_with_last_post(self):
+        leo = User.objects.create_user(username='leo')
+        first = self.create_post(leo)
+        self.create_post(leo)
+        other = self.create_post(User.objects.create_user(username='other'))
+        self.assertEqual(first.image.name, other.image.name)
+        name = first.image.name
+        generate_thumbnails(name)
+        thumbnail = prepared_thumbnail(first.image, '960x339')
+        self.assertTrue(default_storage.exists(thumbnail.name))
+
+        first.delete()
+        self.assertTrue(default_storage.exists(name))
+        # Каскадное удаление тоже освобождает ссылки.
+        leo.delete()
+        self.assertTrue(default_storage.exists(name))
+        other.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(thumbnail.name))
+
+    def test_replaced_image_is_released(self):
+        post = self.create_post(User.objects.create_user(username='leo'))
+        name = post.image.name
+        post.image = SimpleUploadedFile('photo.jpg', jpeg())
+        post.save()
+        self.assertFalse(default_storage.exists(name))
+        self.assertTrue(default_storage.exists(post.image.name))
+
+    def test_release_rechecks_references_under_lock(self):
+        leo = User.objects.create_user(username='leo')
+        post = self.create_post(leo)
+        name = post.image.name
+        with mock.patch('django.db.transaction.on_commit') as on_commit:
+            post.delete()
+        # Пока удаление файла ждало фиксации, картинку загрузили снова.
+        again = self.create_post(leo)
+        for (func,), _ in on_commit.call_args_list:
+            func()
+        self.assertTrue(default_storage.exists(name))
+        self.assertTrue(StoredImage.objects.filter(name=name).exists())
+
+        again.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(StoredImage.objects.filter(name=name).exists())
+        # Удалённый файл записывается заново при следующей загрузке.
+        self.assertEqual(self.create_post(leo).image.name, name)
+        self.assertTrue(default_storage.exists(name))
@@ -0,0 +1,103 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Group, Post
+from ..page_cache import REFRESH_KEY, page_key
+
+User = get_user_model()
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Группа', slug='test-slug', description='Описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа', slug='other-slug', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.urls = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_posts', args=[self.group.slug]),
+            'other_group': reverse(
+                'posts:group_posts', args=[self.other_group.slug]
+            ),
+            'profile': reverse('posts:profile', args=[self.author.username]),
+            'post': reverse('posts:post_detail', args=[self.post.pk]),
+        }
+
+    def warm(self, *names):
+        # Первый показ запоминает id объекта страницы, второй кладёт
+        # страницу в кэш.
+        for name in names:
+            self.guest_client.get(self.urls[name])
+            self.guest_client.get(self.urls[name])
+
+    def assertCached(self, name):
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(self.urls[name])
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_pages_are_served_from_cache(self):
+        self.warm(*self.urls)
+        for name in self.urls:
+            with self.subTest(page=name):
+                self.assertCached(name)
+
+    def test_new_post_purges_only_affected_pages(self):
+        self.warm(*self.urls)
+        Post.objects.create(text='Новый пост', author=self.author,
+                            group=self.group)
+        for name in ('index', 'group', 'profile'):
+            with self.subTest(page=name):
+                self.assertContains(
+                    self.guest_client.get(self.urls[name]), 'Новый пост'
+                )
+        self.assertCached('other_group')
+
+    def test_comment_purges_only_post_page(self):
+        self.warm(*self.urls)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий'
+        )
+        self.assertContains(
+            self.guest_client.get(self.urls['post']), 'Комментарий'
+        )
+        for name in ('index', 'group', 'profile'):
+            with self.subTest(page=name):
+                self.assertCached(name)
+
+    def test_authorized_users_are_not_cached(self):
+        client = Client()
+        client.force_login(self.author)
+        client.get(self.urls['index'])
+        response = client.get(self.urls['index'])
+        self.assertIsNotNone(response.context)
+
+    def test_stale_page_while_another_request_refreshes(self):
+        """Пока страницу перерисовывает другой запрос, отдаётся прежняя."""
+        self.warm('index')
+        Post.objects.create(text='Новый пост', author=self.author)
+        request = self.guest_client.get(self.urls['index']).wsgi_request
+        cache.add(REFRESH_KEY.format(page_key(request)), 1)
+        Post.objects.create(text='Ещё пост', author=self.author)
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(self.urls['index'])
+        self.assertContains(response, 'Новый пост')
+        self.assertNotContains(response, 'Ещё пост')
+
+        with override_settings(PAGE_CACHE_STALE_WHILE_REVALIDATE=False):
+            response = self.guest_client.get(self.urls['index'])
+        self.assertContains(response, 'Ещё пост')
@@ -0,0 +1,141 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Post
+from ..paginator import CursorPaginator
+
+User = get_user_model()
+
+POSTS_COUNT = 25
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.author)
+            for i in range(POSTS_COUNT)
+        )
+        # Одинаковая дата у всех постов: порядок держится только на id.
+        pub_date = Post.objects.first().pub_date
+        Post.objects.update(pub_date=pub_date)
+        cls.ordered_ids = list(
+            Post.objects.order_by('pub_date', 'pk')
+            .values_list('pk', flat=True)
+        )
+
+    def setUp(self):
+        self.paginator = CursorPaginator(
+            Post.objects.all(), settings.POSTS_ORDERED_BY
+        )
+
+    def walk_forward(self):
+        pages = [self.paginator.get_cursor_page()]
+        while pages[-1].has_next():
+            pages.append(
+                self.paginator.get_cursor_page(pages[-1].next_cursor)
+            )
+        return pages
+
+    def test_forward_walk_covers_feed_once(self):
+        """Проход по курсорам выдаёт каждый пост ровно один раз."""
+        pages = self.walk_forward()
+        ids = [post.pk for page in pages for post in page]
+        self.assertEqual(ids, self.ordered_ids)
+        self.assertEqual([page.number for page in pages], [1, 2, 3])
+        self.assertEqual(pages[-1].end_index(), POSTS_COUNT)
+
+    def test_backward_walk(self):
+        """Курсор «назад» возвращает предыдущую страницу целиком."""
+        pages = self.walk_forward()
+        previous = self.paginator.get_cursor_page(pages[2].previous_cursor)
+        self.assertEqual(list(previous), list(pages[1]))
+        self.assertEqual(previous.number, 2)
+        first = self.paginator.get_cursor_page(previous.previous_cursor)
+        self.assertEqual(list(first), list(pages[0]))
+        self.assertFalse(first.has_previous())
+
+    def test_invalid_cursor_gives_first_page(self):
+        page = self.paginator.get_cursor_page('garbage')
+        self.assertEqual(page.number, 1)
+        self.assertEqual(
+            [post.pk for post in page],
+            self.ordered_ids[:settings.POSTS_ORDERED_BY]
+        )
+
+    def test_cursor_page_does_not_count(self):
+        """Страница по курсору не выполняет COUNT(*) и OFFSET."""
+        cursor = self.paginator.get_cursor_page().next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            list(self.paginator.get_cursor_page(cursor))
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql'].upper()
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_page_number_fallback(self):
+        """Старые ссылки ?page=N открывают ту же страницу."""
+        response = Client().get(reverse('posts:index') + '?page=3')
+        page = response.context['page_obj']
+        self.assertEqual(page.number, 3)
+        self.assertEqual(
+            [post.pk for post in page],
+            self.ordered_ids[2 * settings.POSTS_ORDERED_BY:]
+        )
+        self.assertFalse(page.has_next())
+        self.assertTrue(page.has_previous())
+
+    def test_last_page_is_read_backward(self):
+        """?page=last читает ленту с конца, без OFFSET."""
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().get(reverse('posts:index') + '?page=last')
+        page = response.context['page_obj']
+        self.assertEqual(page.number, 3)
+        # Неполная страница, та же, что ?page=3.
+        self.assertEqual(
+            [post.pk for post in page],
+            self.ordered_ids[2 * settings.POSTS_ORDERED_BY:]
+        )
+        self.assertFalse(
+            any('OFFSET' in query['sql'].upper() for query in queries)
+        )
+        previous = self.paginator.get_cursor_page(page.previous_cursor)
+        self.assertEqual(previous.number, 2)
+        self.assertEqual(
+            [post.pk for post in previous],
+            self.ordered_ids[
+                settings.POSTS_ORDERED_BY:2 * settings.POSTS_ORDERED_BY
+            ]
+        )
+
+    def test_last_page_of_whole_pages(self):
+        ids = self.ordered_ids[:2 * settings.POSTS_ORDERED_BY]
+        paginator = CursorPaginator(
+            Post.objects.filter(pk__in=ids), settings.POSTS_ORDERED_BY,
+            count=len(ids),
+        )
+        page = paginator.get_page('last')
+        self.assertEqual(page.number, 2)
+        self.assertEqual(
+            [post.pk for post in page], ids[settings.POSTS_ORDERED_BY:]
+        )
+        self.assertTrue(page.has_previous())
+
+    def test_last_page_link(self):
+        paginator = CursorPaginator(
+            Post.objects.all(), settings.POSTS_ORDERED_BY, count=POSTS_COUNT
+        )
+        html = render_to_string('posts/includes/paginator.html', {
+            'page_obj': paginator.get_cursor_page(),
+            'request': RequestFactory().get('/'),
+        })
+        # Номер последней страницы в окне и «Последняя».
+        self.assertEqual(html.count('href="?page=last"'), 2)
+        self.assertNotIn('page=3', html)
@@ -0,0 +1,111 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils.text import Truncator
+
+from ..models import Comment, Follow, Group, Post
+from .utils import QueryBudgetMixin
+
+User = get_user_model()
+
+# Сколько запросов к базе может сделать страница. Бюджет не зависит от
+# числа постов и комментариев: запрос на каждую строку — это N+1.
+VIEW_QUERY_BUDGETS = {
+    'posts:index': 4,
+    'posts:group_posts': 5,
+    'posts:profile': 4,
+    'posts:follow_index': 5,
+    'posts:post_detail': 4,
+}
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.authors = [
+            User.objects.create_user(username=f'auth{i}') for i in range(5)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+            for i in range(3):
+                cls.post = Post.objects.create(
+                    text=f'Пост {i}', author=author, group=cls.group
+                )
+        for author in cls.authors:
+            Comment.objects.create(
+                post=cls.post, author=author, text='Комментарий'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(QueryBudgetTests.reader)
+
+    def test_views_stay_within_budget(self):
+        args = {
+            'posts:group_posts': [self.group.slug],
+            'posts:profile': [self.authors[0].username],
+            'posts:post_detail': [self.post.pk],
+        }
+        for name, budget in VIEW_QUERY_BUDGETS.items():
+            url = reverse(name, args=args.get(name))
+            # Счётчики заводятся при первом показе; меряем страницу
+            # с заведёнными счётчиками, но с пустым кэшем.
+            self.client.get(url)
+            cache.clear()
+            with self.subTest(view=name), self.assertMaxQueries(budget):
+                self.client.get(url)
+
+
+class FeedProjectionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            text='Начало ' + 'очень длинного текста ' * 100,
+            author=cls.author,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(POST_PREVIEW_LENGTH=30)
+    def test_feed_loads_preview_only(self):
+        """Лента не грузит полный текст поста и лишние столбцы автора."""
+        response = self.client.get(reverse('posts:index'))
+        [post] = response.context['page_obj']
+        self.assertIn('text', post.get_deferred_fields())
+        self.assertIn('password', post.author.get_deferred_fields())
+        self.assertContains(
+            response, Truncator(self.post.text).chars(30)
+        )
+        self.assertNotContains(response, self.post.text)
+
+    def test_truncated_card_links_to_full_text(self):
+        """Из любой ленты можно дойти до полного текста поста."""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        self.client.force_login(reader)
+        detail_url = reverse('posts:post_detail', args=[self.post.pk])
+        for url in (reverse('posts:index'), reverse('posts:follow_index')):
+            with self.subTest(url=url):
+                cache.clear()
+                self.assertContains(self.client.get(url), detail_url)
+                cache.clear()
+                with override_settings(POST_PREVIEW_LENGTH=10_000):
+                    self.assertNotContains(self.client.get(url), detail_url)
+
+    def test_full_text_on_post_detail(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        self.assertContains(response, self.post.text)
@@ -0,0 +1,70 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+# Чтение таблицы целиком или сортировка во временном B-дереве.
+FULL_SCAN = re.compile(r'\bSCAN (?:TABLE )?\w+\b(?! USING)|TEMP B-TREE')
+
+
+class FeedQueryPlanTests(TestCase):
+    """Запросы лент должны идти по индексам, а не перебирать таблицу."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(15):
+            Post.objects.create(
+                text=f'Пост номер {i}', author=cls.author, group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(FeedQueryPlanTests.reader)
+
+    def feed_queries(self, url):
+        """SQL всех запросов к таблицам постов при показе двух страниц."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            self.client.get(
+                url + '?cursor=' + response.context['page_obj'].next_cursor
+            )
+        return [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "posts_' in query['sql']
+        ]
+
+    def query_plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return '\n'.join(row[-1] for row in cursor.fetchall())
+
+    def test_feeds_use_indexes(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            for sql in self.feed_queries(url):
+                plan = self.query_plan(sql)
+                with self.subTest(url=url, sql=sql):
+                    self.assertIsNone(FULL_SCAN.search(plan), plan)
@@ -0,0 +1,102 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Post
+from ..search import SEARCH_TABLE, stem
+
+User = get_user_model()
+
+
+class StemmerTests(TestCase):
+    def test_word_forms_share_stem(self):
+        for forms in (('кот', 'коты', 'котами'),
+                      ('красивая', 'красивые', 'красивого'),
+                      ('играла', 'играть'),
+                      ('ёжик', 'ежики')):
+            with self.subTest(forms=forms):
+                self.assertEqual(len({stem(word) for word in forms}), 1)
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.cats = Post.objects.create(
+            text='Мои коты любят спать', author=cls.author
+        )
+        cls.dogs = Post.objects.create(
+            text='Собака гуляет во дворе', author=cls.author
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def search(self, query, **params):
+        return self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+
+    def test_finds_other_word_forms(self):
+        response = self.search('котами')
+        self.assertEqual(list(response.context['page_obj']), [self.cats])
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.get(pk=self.dogs.pk)
+        post.text = 'Теперь про котов'
+        post.save()
+        self.assertEqual(len(self.search('кот').context['page_obj']), 2)
+        self.assertEqual(len(self.search('собака').context['page_obj']), 0)
+        Post.objects.get(pk=self.cats.pk).delete()
+        self.assertEqual(
+            list(self.search('кот').context['page_obj']), [post]
+        )
+
+    def test_rebuild_command_fills_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        self.assertEqual(len(self.search('кот').context['page_obj']), 0)
+        out = StringIO()
+        call_command('rebuild_search_index', batch_size=1, stdout=out)
+        self.assertIn('Проиндексировано постов: 2', out.getvalue())
+        self.assertEqual(
+            list(self.search('котами').context['page_obj']), [self.cats]
+        )
+
+    def test_relevant_first(self):
+        best = Post.objects.create(
+            text='Коты, коты и ещё раз коты', author=self.author
+        )
+        results = list(self.search('коты').context['page_obj'])
+        self.assertEqual(results[0], best)
+
+    @override_settings(POSTS_ORDERED_BY=2)
+    def test_cursor_pages_keep_query(self):
+        for i in range(4):
+            Post.objects.create(text=f'Кот номер {i}', author=self.author)
+        first = self.search('кот')
+        self.assertContains(first, '?q=%D0%BA%D0%BE%D1%82&amp;cursor=')
+        second = self.search(
+            'кот', cursor=first.context['page_obj'].next_cursor
+        )
+        third = self.search(
+            'кот', cursor=second.context['page_obj'].next_cursor
+        )
+        found = [
+            post for response in (first, second, third)
+            for post in response.context['page_obj']
+        ]
+        self.assertEqual(len(found), 5)
+        self.assertEqual(len(set(found)), 5)
+        self.assertFalse(third.context['page_obj'].has_next())
+
+    def test_query_operators_are_ignored(self):
+        response = self.search('кот OR NOT "собака*')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail.images import ImageFile
+
+from ..cards import render_cards
+from ..kvstore import KVStore
+from ..models import Post
+from ..thumbnails import ThumbnailPool, generate_thumbnails
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class TemporaryKVStoreMixin:
+    """Метаданные миниатюр каждого теста в отдельном файле."""
+
+    def setUp(self):
+        super().setUp()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        settings_override = override_settings(
+            THUMBNAIL_KVSTORE_PATH=os.path.join(tmp_dir, 'kv.sqlite3')
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class TemporaryMediaMixin:
+    """Файлы каждого теста в отдельном каталоге ``media_root``."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class ThumbnailTests(TemporaryKVStoreMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.author,
+            image=SimpleUploadedFile(
+                name='thumb.gif', content=SMALL_GIF, content_type='image/gif'
+            ),
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(ThumbnailTests.author)
+
+    def test_card_shows_original_until_thumbnail_is_ready(self):
+        """Пока миниатюры нет, в карточке исходная картинка; готовая
+        миниатюра подменяет её без правки поста.
+        """
+        [card] = render_cards([self.post], 'index')
+        self.assertIn(self.post.image.url, card)
+        generate_thumbnails(self.post.image.name)
+        [card] = render_cards([self.post], 'index')
+        self.assertNotIn(self.post.image.url, card)
+        self.assertIn('/media/cache/', card)
+
+    def test_post_create_does_not_render_thumbnails(self):
+        """Миниатюры рисуются в фоне, а не в запросе создания поста."""
+        with mock.patch('posts.thumbnails.pool.submit') as submit, \
+                mock.patch('django.db.transaction.on_commit',
+                           side_effect=lambda func: func()):
+            self.author_client.post(
+                reverse('posts:post_create'),
+                data={
+                    'text': 'Новый пост',
+                    'image': SimpleUploadedFile(
+                        name='new.gif',
+                        content=SMALL_GIF,
+                        content_type='image/gif',
+                    ),
+                },
+            )
+        post = Post.objects.get(text='Новый пост')
+        submit.assert_called_once_with(post.image.name)
+
+    def test_pool_skips_queued_image(self):
+        pool = ThumbnailPool()
+        with mock.patch('posts.thumbnails.generate_thumbnails'), \
+                mock.patch.object(pool, '_run'):
+            self.assertTrue(pool.submit('posts/thumb.gif'))
+            self.assertFalse(pool.submit('posts/thumb.gif'))
+
+
+class KVStoreTests(TemporaryKVStoreMixin, TestCase):
+    def image_file(self, name):
+        image_file = ImageFile(name)
+        image_file.set_size((960, 339))
+        return image_file
+
+    def test_metadata_survives_restart(self):
+        """Новый экземпляр хранилища видит записи прежнего."""
+        KVStore().set(self.image_file('cache/a.gif'))
+        restarted = KVStore()
+        self.assertEqual(
+            restarted.get(self.image_file('cache/a.gif')).size, [960, 339]
+        )
+        self.assertEqual(
+            list(restarted._find_keys()),
+            [self.image_file('cache/a.gif').key],
+        )
+
+    def test_get_many_returns_only_found(self):
+        kvstore = KVStore()
+        kvstore.set(self.image_file('cache/a.gif'))
+        kvstore.set(self.image_file('cache/b.gif'))
+        files = [
+            self.image_file(name)
+            for name in ('cache/a.gif', 'cache/b.gif', 'cache/c.gif')
+        ]
+        found = kvstore.get_many(files)
+        self.assertEqual(set(found), {files[0].key, files[1].key})
+        self.assertEqual(found[files[1].key].name, 'cache/b.gif')
+
+    def test_forked_process_reconnects(self):
+        """Процесс после fork не пользуется соединением родителя."""
+        kvstore = KVStore()
+        parent = kvstore.connection
+        with mock.patch('os.getpid', return_value=os.getpid() + 1):
+            self.assertIsNot(kvstore.connection, parent)
@@ -0,0 +1,118 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+
+from ..models import CelebrityAuthor, Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.stranger = User.objects.create_user(username='stranger')
+        cls.old_post = Post.objects.create(
+            text='Запись до подписки', author=cls.author
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(TimelineTests.follower)
+
+    def feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_timeline(self):
+        """При подписке в ленту попадают прежние посты автора."""
+        self.client.get(reverse('posts:profile_follow', args=[self.author]))
+        self.assertEqual(self.feed(), [self.old_post])
+
+    def test_new_post_is_fanned_out(self):
+        """Новый пост раскладывается только в ленты подписчиков."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='Новая запись', author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.follower, post=post
+            ).exists()
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.stranger).exists()
+        )
+        self.assertEqual(self.feed(), [self.old_post, post])
+
+    def test_unfollow_prunes_timeline(self):
+        self.client.get(reverse('posts:profile_follow', args=[self.author]))
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[self.author])
+        )
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.follower).exists()
+        )
+
+    @override_settings(TIMELINE_CELEBRITY_THRESHOLD=2)
+    def test_celebrity_posts_are_merged_on_read(self):
+        """Посты «звезды» не раскладываются, а подмешиваются при чтении
+        в общем порядке с разложенными постами.
+        """
+        regular = User.objects.create_user(username='regular')
+        Follow.objects.create(user=self.follower, author=regular)
+        Follow.objects.create(user=self.stranger, author=self.author)
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.assertTrue(
+            CelebrityAuthor.objects.filter(author=self.author).exists()
+        )
+        first = Post.objects.create(text='Обычный автор', author=regular)
+        second = Post.objects.create(text='Звезда', author=self.author)
+        third = Post.objects.create(text='Снова обычный', author=regular)
+        self.assertFalse(TimelineEntry.objects.filter(post=second).exists())
+        self.assertEqual(
+            self.feed(), [self.old_post, first, second, third]
+        )
+
+    @override_settings(TIMELINE_CELEBRITY_THRESHOLD=1,
+                       TIMELINE_FIRST_POSTS=3, POSTS_ORDERED_BY=2)
+    def test_first_page_reads_celebrity_posts_from_cache(self):
+        """Лента начинается со старых постов: их и держит кэш «звезды»."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        posts = [self.old_post] + [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(4)
+        ]
+        self.feed()
+        misses = metrics.snapshot().get('timeline_pull_cache_misses_total', 0)
+        self.assertEqual(self.feed(), posts[:2])
+        self.assertEqual(
+            metrics.snapshot().get('timeline_pull_cache_misses_total', 0),
+            misses,
+        )
+        pages = [self.client.get(reverse('posts:follow_index'))]
+        while pages[-1].context['page_obj'].has_next():
+            pages.append(self.client.get(
+                reverse('posts:follow_index'),
+                {'cursor': pages[-1].context['page_obj'].next_cursor},
+            ))
+        self.assertEqual(
+            [post for page in pages for post in page.context['page_obj']],
+            posts,
+        )
+        previous = self.client.get(
+            reverse('posts:follow_index'),
+            {'cursor': pages[-1].context['page_obj'].previous_cursor},
+        )
+        self.assertEqual(list(previous.context['page_obj']), posts[2:4])
+
+    def test_threshold_in_metrics(self):
+        admin = User.objects.create_user(username='admin', is_staff=True)
+        self.client.force_login(admin)
+        response = self.client.get(reverse('metrics'))
+        self.assertContains(response, 'timeline_celebrity_threshold 10000')
@@ -338,13 +338,24 @@ class PostViewsTests(TestCase):
         кто не подписан на него
         """
         response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
 
         self.authorized_client.get(
             reverse('posts:profile_follow', args=[self.author]))
+        new_post = Post.objects.create(
+            text='Запись для подписчиков',
+            author=self.author,
+        )
 
         response_after_follow = self.authorized_client.get(
             reverse('posts:follow_index'))
-
-        self.assertEqual(response.content, response_after_follow.content)                
-
-   
\ No newline at end of file
+        self.assertNotEqual(response.content, response_after_follow.content)
+        # Лента упорядочена по дате: новая запись на последней странице.
+        response_last_page = self.authorized_client.get(
+            reverse('posts:follow_index') + '?page=2')
+        self.assertIn(new_post, response_last_page.context['page_obj'])
+
+        response_not_follower = self.authorized_client_author.get(
+            reverse('posts:follow_index') + '?page=2')
+        self.assertNotIn(
+            new_post, response_not_follower.context['page_obj'])
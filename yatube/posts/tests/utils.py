@@ -0,0 +1,25 @@
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Проверка бюджета запросов к базе для ``TestCase``."""
+
+    @contextmanager
+    def assertMaxQueries(self, budget, using='default'):
+        """Как ``assertNumQueries``, но допускает и меньшее число
+        запросов, а при превышении бюджета выводит их все.
+        """
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(
+                f'{number}. {query["sql"]}'
+                for number, query in enumerate(context.captured_queries, 1)
+            )
+            self.fail(
+                f'{executed} запросов вместо не более {budget}:\n{queries}'
+            )
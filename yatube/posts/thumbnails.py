@@ -0,0 +1,145 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Миниатюры стандартных размеров из ``THUMBNAIL_PRESETS`` рисуются в пуле
+потоков после сохранения поста, а не в запросе, который первым покажет
+картинку. Пока миниатюры нет, шаблоны получают исходную картинку.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+class LookupBackend(ThumbnailBackend):
+    """Находит готовые миниатюры, не создавая их."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        # Те же умолчания, что и в ThumbnailBackend.get_thumbnail,
+        # иначе имя миниатюры не совпадёт с созданной sorl.
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def lookup_many(self, files, geometry_string, **options):
+        """Готовые миниатюры файлов, ``None`` для ещё не созданных."""
+        thumbnails = [
+            self.thumbnail_file(file_, geometry_string, **options)
+            for file_ in files
+        ]
+        if not hasattr(default.kvstore, 'get_many'):
+            return [default.kvstore.get(thumbnail) for thumbnail in thumbnails]
+        found = default.kvstore.get_many(thumbnails)
+        return [found.get(thumbnail.key) for thumbnail in thumbnails]
+
+
+lookup_backend = LookupBackend()
+
+
+def generate_thumbnails(name):
+    """Рисует все стандартные миниатюры картинки."""
+    # Хранилище входит в ключ миниатюры, поэтому оно то же, что у поля.
+    source = ImageFile(name, Post._meta.get_field('image').storage)
+    for geometry, options in settings.THUMBNAIL_PRESETS.items():
+        default.backend.get_thumbnail(source, geometry, **options)
+
+
+class ThumbnailPool:
+    """Пул потоков с локальной очередью картинок на обработку.
+
+    ``job(name)`` выполняется для каждой картинки в очереди. Одна и та же
+    картинка не ставится в очередь дважды, а при переполнении очереди
+    задача отбрасывается: миниатюра будет нарисована при следующем показе.
+    """
+
+    def __init__(self, job=generate_thumbnails,
+                 thread_name_prefix='thumbnails'):
+        self.job = job
+        self.thread_name_prefix = thread_name_prefix
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = set()
+
+    def submit(self, name):
+        with self._lock:
+            if (name in self._pending
+                    or len(self._pending) >= settings.THUMBNAIL_MAX_PENDING):
+                return False
+            self._pending.add(name)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.THUMBNAIL_WORKERS,
+                    thread_name_prefix=self.thread_name_prefix,
+                )
+        self._executor.submit(self._run, name)
+        return True
+
+    def _run(self, name):
+        try:
+            self.job(name)
+        except Exception:
+            logger.exception('Не удалось обработать картинку %s', name)
+        finally:
+            with self._lock:
+                self._pending.discard(name)
+            close_old_connections()
+
+
+pool = ThumbnailPool()
+
+
+def schedule(image):
+    """Ставит картинку в очередь после фиксации транзакции."""
+    if not image:
+        return
+    name = image.name
+    transaction.on_commit(lambda: pool.submit(name))
+
+
+def prepared_thumbnails(images, geometry):
+    """Готовые миниатюры или, пока их нет, сами картинки.
+
+    Метаданные всех миниатюр ищутся одним обращением к хранилищу.
+    """
+    present = [image for image in images if image]
+    thumbnails = dict(zip(
+        [image.name for image in present],
+        lookup_backend.lookup_many(
+            present, geometry,
+            **settings.THUMBNAIL_PRESETS.get(geometry, {})
+        ),
+    ))
+    prepared = []
+    for image in images:
+        if not image:
+            prepared.append(None)
+        elif thumbnails[image.name] is not None:
+            prepared.append(thumbnails[image.name])
+        else:
+            schedule(image)
+            prepared.append(image)
+    return prepared
+
+
+def prepared_thumbnail(image, geometry):
+    """Готовая миниатюра или, пока её нет, сама картинка."""
+    [prepared] = prepared_thumbnails([image], geometry)
+    return prepared
@@ -0,0 +1,260 @@
+"""Ленты подписок: раскладка при записи и подмешивание при чтении.
+
+Пост обычного автора сразу раскладывается в ``TimelineEntry`` всех его
+подписчиков, поэтому ``follow_index`` читает страницу ленты по индексу
+``(user, pub_date, post)`` вместо соединения ``Follow`` и ``Post``.
+При подписке лента дополняется последними постами автора, при
+отписке — очищается от них.
+
+Раскладывать посты автора с огромным числом подписчиков слишком
+дорого, поэтому, набрав ``TIMELINE_CELEBRITY_THRESHOLD`` подписчиков,
+автор становится ``CelebrityAuthor``: его посты подмешиваются в ленту
+при чтении из кэша первых постов автора k-путевым слиянием по
+``(pub_date, id)``.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import metrics
+from core.singleflight import get_or_set
+
+from .models import CelebrityAuthor, Follow, Post, TimelineEntry
+from .paginator import CursorPaginator
+
+FIRST_POSTS_KEY = 'timeline:first:{}'
+ENTRY_KEY_FIELDS = [('pub_date', False), ('post_id', False)]
+
+
+def _bulk_insert(entries):
+    """Пишет записи лент пачками, не держа в памяти весь список."""
+    entries = iter(entries)
+    batch_size = settings.TIMELINE_FANOUT_BATCH_SIZE
+    inserted = 0
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        inserted += len(batch)
+    return inserted
+
+
+def follower_ids(author_id):
+    """Id подписчиков автора, прочитанные пачками по ключу user_id."""
+    followers = (
+        Follow.objects.filter(author_id=author_id)
+        .order_by('user_id')
+        .values_list('user_id', flat=True)
+    )
+    batch_size = settings.TIMELINE_FANOUT_BATCH_SIZE
+    last_id = None
+    while True:
+        batch = followers
+        if last_id is not None:
+            batch = batch.filter(user_id__gt=last_id)
+        batch = list(batch[:batch_size])
+        yield from batch
+        if len(batch) < batch_size:
+            break
+        last_id = batch[-1]
+
+
+def is_celebrity(author_id):
+    return CelebrityAuthor.objects.filter(author_id=author_id).exists()
+
+
+def promote_if_celebrity(author_id):
+    """Переводит автора на подмешивание при чтении, если у него
+    набралось достаточно подписчиков. Обратного перевода нет:
+    иначе из лент пропали бы посты, которые не раскладывались.
+    """
+    if is_celebrity(author_id):
+        return False
+    followers = Follow.objects.filter(author_id=author_id).count()
+    if followers < settings.TIMELINE_CELEBRITY_THRESHOLD:
+        return False
+    _, created = CelebrityAuthor.objects.get_or_create(
+        author_id=author_id,
+        defaults={'followers_at_promotion': followers},
+    )
+    if created:
+        metrics.incr('timeline_celebrity_promotions_total')
+    return created
+
+
+def fan_out_post(post):
+    """Раскладывает пост в ленты всех подписчиков обычного автора."""
+    fan_out_posts([post])
+
+
+def fan_out_posts(posts):
+    """Как ``fan_out_post``, но подписчиков каждого автора читает
+    один раз на всю пачку постов.
+    """
+    by_author = {}
+    for post in posts:
+        by_author.setdefault(post.author_id, []).append(post)
+    for author_id, author_posts in by_author.items():
+        if is_celebrity(author_id):
+            forget_first_posts(author_id)
+            metrics.incr('timeline_pull_posts_total', len(author_posts))
+            continue
+        # У обычного автора подписчиков меньше порога знаменитости.
+        followers = list(follower_ids(author_id))
+        pushed = _bulk_insert(
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post.pk,
+                author_id=author_id,
+                pub_date=post.pub_date,
+            )
+            for post in author_posts
+            for user_id in followers
+        )
+        metrics.incr('timeline_push_posts_total', len(author_posts))
+        metrics.incr('timeline_push_entries_total', pushed)
+
+
+def backfill(user, author):
+    """Добавляет в ленту подписчика последние посты автора."""
+    author_id = getattr(author, 'pk', author)
+    if is_celebrity(author_id):
+        return
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date', '-pk')
+        .values_list('pk', 'pub_date')
+        [:settings.TIMELINE_BACKFILL_LIMIT]
+    )
+    _bulk_insert(
+        TimelineEntry(
+            user_id=getattr(user, 'pk', user),
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts
+    )
+
+
+def prune(user, author):
+    """Убирает из ленты подписчика все посты автора."""
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+
+
+def followed_celebrity_ids(user):
+    return list(
+        Follow.objects.filter(user=user, author__celebrity__isnull=False)
+        .values_list('author_id', flat=True)
+    )
+
+
+def first_post_keys(author_id):
+    """Ключи ``(pub_date, id)`` первых постов автора по возрастанию
+    и признак того, что это все посты автора.
+
+    Ленты листаются от старых постов к новым, поэтому в кэше лежит
+    начало ленты автора: его читает первая страница.
+    """
+    def fetch():
+        limit = settings.TIMELINE_FIRST_POSTS
+        keys = list(
+            Post.objects.filter(author_id=author_id)
+            .order_by('pub_date', 'pk')
+            .values_list('pub_date', 'pk')[:limit + 1]
+        )
+        complete = len(keys) <= limit
+        return keys[:limit], complete
+
+    # Посты знаменитости подмешиваются во многие ленты сразу.
+    return get_or_set(
+        FIRST_POSTS_KEY.format(author_id), fetch,
+        settings.TIMELINE_FIRST_POSTS_TIMEOUT,
+    )
+
+
+def forget_first_posts(author_id):
+    cache.delete(FIRST_POSTS_KEY.format(author_id))
+
+
+class TimelinePaginator(CursorPaginator):
+    """Лента подписок: разложенные записи, слитые с постами «звёзд»."""
+
+    def __init__(self, object_list, per_page, user=None, **kwargs):
+        self.user = user
+        self.pulled_author_ids = followed_celebrity_ids(user)
+        super().__init__(object_list, per_page, **kwargs)
+
+    def pushed_keys(self, values, forward, limit):
+        entries = TimelineEntry.objects.filter(user=self.user)
+        if values is not None:
+            entries = entries.filter(
+                self.keyset_filter(values, forward, ENTRY_KEY_FIELDS)
+            )
+        ordering = ('pub_date', 'post_id')
+        if not forward:
+            ordering = ('-pub_date', '-post_id')
+        return list(
+            entries.order_by(*ordering)
+            .values_list('pub_date', 'post_id')[:limit]
+        )
+
+    def pulled_keys(self, author_id, values, forward, limit):
+        """Ключи постов автора-«звезды» из кэша первых постов.
+
+        Если нужный участок ленты дальше закэшированного окна,
+        ключи читаются из базы.
+        """
+        keys, complete = first_post_keys(author_id)
+        start = tuple(values) if values is not None else None
+        if forward:
+            after = [
+                key for key in keys if start is None or key > start
+            ][:limit]
+            if complete or len(after) == limit:
+                return after
+        elif complete or (keys and start is not None and start <= keys[-1]):
+            return [
+                key for key in reversed(keys) if start is None or key < start
+            ][:limit]
+        metrics.incr('timeline_pull_cache_misses_total')
+        posts = Post.objects.filter(author_id=author_id)
+        if values is not None:
+            posts = posts.filter(self.keyset_filter(values, forward))
+        ordering = ('pub_date', 'pk') if forward else ('-pub_date', '-pk')
+        return list(
+            posts.order_by(*ordering).values_list('pub_date', 'pk')[:limit]
+        )
+
+    def fetch(self, values, forward, limit):
+        sources = [self.pushed_keys(values, forward, limit)]
+        sources.extend(
+            self.pulled_keys(author_id, values, forward, limit)
+            for author_id in self.pulled_author_ids
+        )
+        if self.pulled_author_ids:
+            metrics.incr(
+                'timeline_pulled_authors_total', len(self.pulled_author_ids)
+            )
+        post_ids = []
+        for _, post_id in heapq.merge(*sources, reverse=not forward):
+            # Пост мог быть разложен до того, как автор стал «звездой».
+            if post_id not in post_ids:
+                post_ids.append(post_id)
+            if len(post_ids) == limit:
+                break
+        posts = (
+            Post.objects.feed().in_bulk(post_ids)
+        )
+        return [posts[pk] for pk in post_ids if pk in posts]
+
+
+def collect_metrics():
+    return {
+        'timeline_celebrity_threshold':
+            settings.TIMELINE_CELEBRITY_THRESHOLD,
+        'timeline_celebrity_authors': CelebrityAuthor.objects.count(),
+    }
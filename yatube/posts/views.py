@@ -1,21 +1,48 @@
-from django.core.paginator import Paginator
+import json
+
 from django.shortcuts import render, get_object_or_404
 from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
-from django.views.decorators.cache import cache_page
+from django.db import transaction
+from django.http import (HttpResponseBadRequest, HttpResponseForbidden,
+                         JsonResponse, StreamingHttpResponse)
+from django.template.loader import render_to_string
+from django.utils.http import urlencode
+from django.views.decorators.http import condition, require_POST
 
 from .models import Post, Group, User, Follow
+from .bulk import BulkImporter, BulkImportError, upload_opener
 from .forms import PostForm, CommentForm
+from .comments import get_comment_page
+from .export import EXPORT_SOURCES, FORMATS, export_stream
+from .etags import (group_etag, group_scopes, index_etag, index_scopes,
+                    post_etag, post_scopes, profile_etag, profile_scopes,
+                    remember_id)
+from .counters import get_feed_count, get_user_counters
+from .feed_cache import feed_cache_context
+from .page_cache import cache_anonymous_page
+from .paginator import CursorPaginator
+from .search import search_paginator
+from .timeline import TimelinePaginator
+from .images import schedule as schedule_image
 
 
-def get_pagination(queryset, request):
+def get_pagination(queryset, request, count=None,
+                   paginator_class=CursorPaginator, **paginator_kwargs):
     # Показывать по 10 записей на странице.
-    paginator = Paginator(queryset, settings.POSTS_ORDERED_BY)
-    # Из URL извлекаем номер запрошенной страницы - это значение параметра page
+    # Число записей (если известно) берётся из счётчиков ленты.
+    paginator = paginator_class(
+        queryset, settings.POSTS_ORDERED_BY, count=count, **paginator_kwargs
+    )
+    # Позиция в ленте передаётся курсором ?cursor=, а старые ссылки
+    # вида ?page=N по-прежнему открывают страницу с нужным номером.
     page_number = request.GET.get('page')
-    # Получаем набор записей для страницы с запрошенным номером
-    page_obj = paginator.get_page(page_number)
+    cursor = request.GET.get('cursor')
+    if cursor is None and page_number is not None:
+        page_obj = paginator.get_page(page_number)
+    else:
+        page_obj = paginator.get_cursor_page(cursor)
     return {
         'paginator': paginator,
         'page_number': page_number,
@@ -23,61 +50,110 @@ def get_pagination(queryset, request):
     }
 
 
+@condition(etag_func=index_etag)
+@cache_anonymous_page(index_scopes)
 def index(request):
-    post_list = Post.objects.select_related('group', 'author').all()
-    context = get_pagination(post_list, request)
+    post_list = Post.objects.for_index()
+    context = get_pagination(post_list, request, get_feed_count())
+    context.update(feed_cache_context('index', request))
     return render(request, 'posts/index.html', context)
 
 
+@condition(etag_func=group_etag)
+@cache_anonymous_page(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    remember_id('group', slug, group.pk)
+    post_list = Post.objects.for_group(group)
     context = {
         'group': group,
         'post_list': post_list,
     }
     # Дополнить словарь контекст результатом get_pagination()
-    context.update(get_pagination(post_list, request))
+    context.update(
+        get_pagination(post_list, request, get_feed_count(group=group))
+    )
+    context.update(feed_cache_context('group', request, group=group))
     return render(request, 'posts/group_list.html', context)
 
 
+@condition(etag_func=profile_etag)
+@cache_anonymous_page(profile_scopes)
 def profile(request, username):
     # Здесь код запроса к модели и создание словаря контекста
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username
+    )
+    remember_id('user', username, author.pk)
     # Все посты за авторством user
-    post_list = author.posts.all()
-    counter = post_list.count()
-    following = author.following.all()
-    follower = author.follower.all()
-    count_follower = follower.count()
-    count_following = following.count()
-    
+    post_list = Post.objects.for_author(author)
+    counters = get_user_counters(author)
+    counter = counters.posts_count
+
     context = {
         'author': author,
         'couter': counter,
-        'count_follower': count_follower,
-        'count_following': count_following,
+        'count_follower': counters.following_count,
+        'count_following': counters.followers_count,
     }
-    context.update(get_pagination(post_list, request))
+    context.update(get_pagination(post_list, request, counter))
+    context.update(feed_cache_context('profile', request, author=author))
     return render(request, 'posts/profile.html', context)
 
 
+@condition(etag_func=post_etag)
+@cache_anonymous_page(post_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    username = post.author
-    posts_all = username.posts.all().count()
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'), pk=post_id
+    )
+    remember_id('post', post_id, post.author_id)
+    posts_all = get_user_counters(post.author).posts_count
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    # Без JavaScript следующие комментарии открываются по ?cursor=.
+    comments, comments_cursor = get_comment_page(
+        post, request.GET.get('cursor')
+    )
     context = {
         'post': post,
         'posts_all': posts_all,
         'form': form,
         'comments': comments,
+        'comments_cursor': comments_cursor,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Следующая страница комментариев для подгрузки на странице поста."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments, cursor = get_comment_page(post, request.GET.get('cursor'))
+    return JsonResponse({
+        'html': render_to_string(
+            'posts/includes/comment_list.html',
+            {'comments': comments},
+            request=request,
+        ),
+        'cursor': cursor,
+    })
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    context = {'query': query}
+    if query:
+        paginator = search_paginator(query, settings.POSTS_ORDERED_BY)
+        context.update({
+            'paginator': paginator,
+            'page_obj': paginator.get_cursor_page(request.GET.get('cursor')),
+            # Ссылки паджинатора сохраняют запрос.
+            'page_query': urlencode({'q': query}) + '&',
+        })
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -87,6 +163,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        schedule_image(post.image, process=form.image_uploaded)
         return redirect('posts:profile', username=request.user)
     context = {
         'form': form,
@@ -95,6 +172,7 @@ def post_create(request):
 
 
 @login_required
+@transaction.atomic
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author != request.user:
@@ -106,7 +184,8 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save()
+        schedule_image(post.image, process=form.image_uploaded)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -117,6 +196,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -128,33 +208,106 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@login_required
+@require_POST
+def bulk_import(request):
+    """Пакетная загрузка записей (см. ``posts.bulk``) для персонала.
+
+    Записи передаются списком JSON в теле запроса или, если нужны
+    картинки, в поле ``records`` формы вместе с файлами; поле ``image``
+    записи — имя поля формы с файлом.
+    """
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    if request.content_type == 'multipart/form-data':
+        data = request.POST.get('records', '')
+    else:
+        data = request.body
+    try:
+        records = json.loads(data)
+    except ValueError:
+        return JsonResponse({'error': 'Неверный JSON'}, status=400)
+    if not isinstance(records, list):
+        return JsonResponse({'error': 'Ожидается список записей'}, status=400)
+    if len(records) > settings.BULK_IMPORT_MAX_RECORDS:
+        return JsonResponse(
+            {'error': 'Слишком много записей в одном запросе'}, status=400
+        )
+    importer = BulkImporter(open_image=upload_opener(request.FILES))
+    try:
+        stats = importer.run(records)
+    except BulkImportError as error:
+        # Пачки до ошибочной записи уже сохранены.
+        return JsonResponse(
+            {'error': str(error), 'imported': importer.stats.as_dict()},
+            status=400,
+        )
+    return JsonResponse(stats.as_dict())
+
+
+@login_required
+def export(request):
+    """Потоковая выгрузка таблиц для персонала.
+
+    ``?format=ndjson|csv``, ``?models=posts,comments`` (по умолчанию все
+    таблицы; для CSV — ровно одна), ``?gzip=1`` — сжатый файл.
+    """
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    export_format = request.GET.get('format', 'ndjson')
+    names = request.GET.get('models', ','.join(EXPORT_SOURCES)).split(',')
+    if (export_format not in FORMATS
+            or any(name not in EXPORT_SOURCES for name in names)
+            or export_format == 'csv' and len(names) != 1):
+        return HttpResponseBadRequest('Неверные параметры выгрузки')
+    compress = request.GET.get('gzip') == '1'
+    filename = f'{"-".join(names)}.{export_format}'
+    content_type = (
+        'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    )
+    if compress:
+        filename += '.gz'
+        content_type = 'application/gzip'
+    response = StreamingHttpResponse(
+        export_stream(names, export_format, compress),
+        content_type=content_type,
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 @login_required
 def follow_index(request):
-    post_list_follow = Post.objects.filter(
-        author__following__user=request.user)
-    # paginator = Paginator(post_list_follow, settings.POSTS_ORDERED_BY)
-    # page_number = request.GET.get('page')
-    # page = paginator.get_page(page_number)
-    # return render(request, 'follow.html',
-    #               {'page': page, 'paginator': paginator})
-    context = get_pagination(post_list_follow, request)
+    # Лента подписок заранее разложена по TimelineEntry, а посты
+    # авторов с огромным числом подписчиков подмешиваются при чтении.
+    context = get_pagination(
+        Post.objects.for_follower(request.user),
+        request,
+        paginator_class=TimelinePaginator,
+        user=request.user,
+    )
+    context.update(
+        feed_cache_context('follow', request, viewer=request.user)
+    )
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     follow = get_object_or_404(User, username=username)
-    already_following = Follow.objects.filter(user=request.user, author=follow).exists()
 
     if request.user.username == username:
         return redirect('posts:profile', username=username)
 
-    if not already_following:
-        Follow.objects.get_or_create(user=request.user, author=follow)
+    # Дубль при гонке параллельных запросов отсекает уникальное
+    # ограничение, а get_or_create тогда находит созданную запись.
+    Follow.objects.get_or_create(user=request.user, author=follow)
     return redirect('posts:profile', username=username)
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     following = get_object_or_404(User, username=username)
     follower = get_object_or_404(Follow, author=following, user=request.user)
@@ -0,0 +1,20 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named
+``application``: the WSGI application run in a pool of ``ASGI_THREADS``
+threads (see ``core.asgi``). Serve it with any ASGI server, e.g.
+
+    uvicorn yatube.asgi:application
+"""
+
+import os
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+from core.asgi import WSGIAdapter
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+application = WSGIAdapter(get_wsgi_application(), settings.ASGI_THREADS)
@@ -134,6 +134,18 @@ STATIC_URL = '/static/'
 
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 
+# Сюда collectstatic собирает статику с хешами в именах и сжатыми копиями.
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+# Файлы меньше этого размера не сжимаются заранее:
+STATIC_COMPRESS_MIN_SIZE = 512
+# Статику и медиа отдаёт сам Django (core.files), без отдельного
+# веб-сервера. Сколько секунд браузер хранит статику с хешем в имени
+# и файлы из MEDIA_ROOT:
+SERVE_FILES = True
+STATIC_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+MEDIA_CACHE_MAX_AGE = 24 * 60 * 60
+
 
 # LOGOUT_REDIRECT_URL = 'posts:index'
 LOGIN_URL = 'users:login'
@@ -146,16 +158,101 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 # Срез постов по 10 шт:
 POSTS_ORDERED_BY = 10
+# Сколько символов текста поста показывать в карточке ленты:
+POST_PREVIEW_LENGTH = 500
+# С какого размера таблицы постов общая лента считается
+# по оценке планировщика, а не точным COUNT(*):
+FEED_COUNT_ESTIMATE_THRESHOLD = 1_000_000
+# Сколько последних постов автора попадает в ленту при подписке:
+TIMELINE_BACKFILL_LIMIT = 1000
+# Размер пачки при раскладке поста по лентам подписчиков:
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+# С какого числа подписчиков посты автора не раскладываются по лентам,
+# а подмешиваются при чтении:
+TIMELINE_CELEBRITY_THRESHOLD = 10_000
+# Сколько первых постов такого автора (с них начинается лента) держать
+# в кэше и сколько секунд:
+TIMELINE_FIRST_POSTS = 200
+TIMELINE_FIRST_POSTS_TIMEOUT = 300
+# Срок жизни фрагментов лент в кэше, секунд. Устаревают они раньше —
+# при смене поколения данных, от которых зависят.
+FEED_CACHE_TIMEOUT = 600
+# Срок жизни страниц для анонимных посетителей в кэше, секунд. Как и
+# фрагменты лент, они устаревают раньше — при смене поколения.
+PAGE_CACHE_TIMEOUT = 600
+# Отдавать устаревшую страницу, пока один запрос рисует новую:
+PAGE_CACHE_STALE_WHILE_REVALIDATE = True
+# Сколько секунд ждать этот запрос, прежде чем рисовать страницу заново:
+PAGE_CACHE_REFRESH_TIMEOUT = 30
+# Сколько секунд ждать, пока значение для кэша считает другой запрос,
+# прежде чем считать самому, и как часто проверять кэш при ожидании:
+SINGLE_FLIGHT_WAIT = 5
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+# Срок блокировки на случай, если считающий процесс упадёт:
+SINGLE_FLIGHT_LOCK_TIMEOUT = 30
+# Срок жизни отрисованной карточки поста в кэше, секунд:
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Комментариев на странице поста и в одной подгрузке:
+COMMENTS_PER_PAGE = 20
+# Срок жизни первой страницы комментариев в кэше, секунд. Новый
+# комментарий сбрасывает её сразу:
+COMMENTS_CACHE_TIMEOUT = 60 * 60
+# Пакетная загрузка: записей в одной транзакции, потоков на сохранение
+# картинок и предел записей в одном запросе к /bulk/:
+BULK_IMPORT_CHUNK_SIZE = 1000
+BULK_IMPORT_IMAGE_WORKERS = 4
+BULK_IMPORT_MAX_RECORDS = 10_000
+# Потоков, в которых yatube.asgi обрабатывает запросы; столько же
+# одновременных подключений к базе у процесса:
+ASGI_THREADS = 16
+# Выгрузка: строк, читаемых из базы за раз, и строк в одном куске ответа:
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BLOCK_LINES = 500
+# Стандартные миниатюры картинок постов: геометрия и опции sorl-thumbnail.
+# Рисуются в фоне после сохранения поста.
+THUMBNAIL_PRESETS = {
+    '960x339': {'crop': 'center', 'upscale': True},
+}
+# Потоков на подготовку миниатюр и предел очереди картинок:
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_MAX_PENDING = 1000
+# Метаданные миниатюр храним в локальном файле SQLite, общем для всех
+# процессов на машине, а не в кэше:
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
+THUMBNAIL_KVSTORE_PATH = os.path.join(BASE_DIR, 'thumbnails.sqlite3')
+# Сколько секунд ждать блокировку файла при записи:
+THUMBNAIL_KVSTORE_TIMEOUT = 5
+
+# Загрузки больше этого размера пишутся во временный файл кусками:
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+FILE_UPLOAD_PERMISSIONS = 0o644
+# Картинки постов: предел размера файла и числа пикселей при загрузке,
+# длинная сторона и качество после пережатия.
+IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+IMAGE_MAX_PIXELS = 50_000_000
+IMAGE_MAX_SIDE = 2048
+IMAGE_QUALITY = 85
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Тесты держат кэш, метаданные миниатюр и медиа во временном каталоге,
+# чтобы не трогать файлы работающего сервера (см. ``core.testing``).
+TEST_RUNNER = 'core.testing.TemporaryDataRunner'
+
 
 # Static files (CSS, JavaScript, Images)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Общий для всех воркеров кэш в локальном файле SQLite:
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100_000,
+            # Предел суммарного объёма значений, байт:
+            'MAX_SIZE': 256 * 2 ** 20,
+        },
     }
 }